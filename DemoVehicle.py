@@ -7,6 +7,7 @@ from math import tan, radians, degrees, copysign
 from pygame.math import Vector2
 
 from lib.SocketClient import SocketClient
+from lib.commands import COMMANDS
 from lib.constants import *
 
 
@@ -88,13 +89,22 @@ class Game:
         self.exit = False
         self.dt = 0
 
+        self.dispatcher = COMMANDS.dispatcher({
+            SOCKET_JOY_FORWARD: lambda speed: self.car.forward(self.dt),
+            SOCKET_JOY_BACKWARD: lambda speed: self.car.reverse(self.dt),
+            SOCKET_JOY_NEUTRAL: lambda: self.car.brake(self.dt),
+            SOCKET_JOY_DIR_RIGHT: lambda: self.car.steer_right(self.dt),
+            SOCKET_JOY_DIR_LEFT: lambda: self.car.steer_left(self.dt),
+            SOCKET_JOY_DIR_NEUTRAL: lambda: self.car.steer_neutral(self.dt),
+        })
+
     def run(self):
         current_dir = os.path.dirname(os.path.abspath(__file__))
         image_path = os.path.join(current_dir, 'assets/car.png')
         car_image = pygame.image.load(image_path)
         ppu = 32
 
-        client = SocketClient(SOCKET_ID_VEHICLE)
+        client = SocketClient(SOCKET_ID_VEHICLE, heartbeat=True)
         client.connect()
         Thread(target=client.listen, args=(self.socket_event,), daemon=True).start()
 
@@ -141,30 +151,7 @@ class Game:
             self.car.steer_neutral(self.dt)
 
     def socket_event(self, message):
-        payload = message.split()
-
-        if len(payload) <= 0:
-            return
-
-        command = payload[0]
-        del payload[0]
-
-        if command == SOCKET_JOY_FORWARD:
-            # speed = 50
-            # if len(payload) >= 0:
-            #     speed = int(payload[0])
-            self.car.forward(self.dt)
-        elif command == SOCKET_JOY_BACKWARD:
-            self.car.reverse(self.dt)
-        elif command == SOCKET_JOY_NEUTRAL:
-            self.car.brake(self.dt)
-
-        if command == SOCKET_JOY_DIR_RIGHT:
-            self.car.steer_right(self.dt)
-        elif command == SOCKET_JOY_DIR_LEFT:
-            self.car.steer_left(self.dt)
-        elif command == SOCKET_JOY_DIR_NEUTRAL:
-            self.car.steer_neutral(self.dt)
+        self.dispatcher(message)
 
 
 if __name__ == '__main__':
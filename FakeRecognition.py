@@ -6,7 +6,7 @@ from lib.constants import *
 
 class FakeRecognition:
     def __init__(self):
-        self.client = SocketClient(SOCKET_ID_RECOGNITION)
+        self.client = SocketClient(SOCKET_ID_RECOGNITION, heartbeat=True)
 
     def connect(self):
         self.client.connect()
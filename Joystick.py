@@ -2,8 +2,12 @@ from threading import Thread
 
 import pygame
 from lib.SocketClient import SocketClient
+from lib.Tracer import Tracer
+from lib.commands import COMMANDS
 from lib.constants import *
 import numpy as np
+import os
+import time
 
 
 class Joystick(object):
@@ -26,7 +30,12 @@ class Joystick(object):
             for i in range(self.joystick.get_numhats()):
                 self.hat_data[i] = (0, 0)
 
-        self.client = SocketClient(SOCKET_ID_JOYSTICK)
+        self.client = SocketClient(SOCKET_ID_JOYSTICK, heartbeat=True)
+        self.tracer = Tracer(self.client) if os.getenv('SOCKET_TRACE') == '1' else None
+        self.dispatcher = COMMANDS.dispatcher({
+            SOCKET_CLOCK: self.tracer.on_clock if self.tracer else lambda sent, server: None,
+        }, lambda command, params: print(command, *params))
+
         self.client.connect()
         # Start listen thread so it will automatically reconnect
         Thread(target=self.client.listen, args=(self.on_message,), daemon=True).start()
@@ -39,10 +48,16 @@ class Joystick(object):
         self.left = False
         self.right = False
 
+        # Time the positions last changed, until sent along with a trace
+        self.changed = None
+
     def listen(self):
         """Listen for events from the joystick."""
         self.thread.start()
 
+        if self.tracer:
+            self.tracer.start()
+
         while True:
             self.clock.tick(10)
 
@@ -56,6 +71,8 @@ class Joystick(object):
                 elif event.type == pygame.JOYHATMOTION:
                     self.hat_data[event.hat] = event.value
 
+                self.changed = time.time()
+
                 button_l2 = self.button_data[6]
                 button_r2 = self.button_data[7]
 
@@ -87,36 +104,40 @@ class Joystick(object):
                     self.right = False
 
     def on_message(self, message):
-        print(message)
+        self.dispatcher(message)
 
     def broadcast(self):
         while True:
             self.clock.tick(10)
 
-            if not self.client.connected:
-                continue
-
-            # Steering
-            if self.left:
-                print('STEER: Left')
-                self.client.send_command(SOCKET_JOY_DIR_LEFT)
-            elif self.right:
-                print('STEER: Right')
-                self.client.send_command(SOCKET_JOY_DIR_RIGHT)
-            else:
-                print('STEER: Neutral')
-                self.client.send_command(SOCKET_JOY_DIR_NEUTRAL)
-
-            # Speed
-            if self.forward > 0:
-                print('Forward', self.forward)
-                self.client.send_command(SOCKET_JOY_FORWARD, self.forward)
-            elif self.reverse > 0:
-                print('Reverse', self.reverse)
-                self.client.send_command(SOCKET_JOY_BACKWARD, self.reverse)
-            else:
-                print('Neutral')
-                self.client.send_command(SOCKET_JOY_NEUTRAL)
+            # Steering and speed of a tick go out together in a single write
+            with self.client.batch() as batch:
+                # Steering
+                if self.left:
+                    print('STEER: Left')
+                    batch.send_command(SOCKET_JOY_DIR_LEFT)
+                elif self.right:
+                    print('STEER: Right')
+                    batch.send_command(SOCKET_JOY_DIR_RIGHT)
+                else:
+                    print('STEER: Neutral')
+                    batch.send_command(SOCKET_JOY_DIR_NEUTRAL)
+
+                # Speed
+                if self.forward > 0:
+                    print('Forward', self.forward)
+                    batch.send_command(SOCKET_JOY_FORWARD, self.forward)
+                elif self.reverse > 0:
+                    print('Reverse', self.reverse)
+                    batch.send_command(SOCKET_JOY_BACKWARD, self.reverse)
+                else:
+                    print('Neutral')
+                    batch.send_command(SOCKET_JOY_NEUTRAL)
+
+                # Trace the speed command when it carries a new input
+                if self.tracer and self.changed is not None:
+                    self.tracer.trace(self.changed, batch)
+                    self.changed = None
 
 
 if __name__ == '__main__':
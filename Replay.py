@@ -0,0 +1,118 @@
+"""Replays a recording of the SocketServer (see SOCKET_RECORD) against a relay or directly into a vehicle.
+
+Messages are re-injected with their recorded timing at 1x or --speed N times as fast, --speed 0
+replays as fast as possible. Against a relay, every recorded source identity gets a connection of
+its own. With --target vehicle the messages for vehicles go into Vehicle.on_message without any
+network or hardware involved.
+
+Usage: python Replay.py recording.bin [--speed 1] [--target relay|vehicle]
+"""
+import argparse
+import select
+import sys
+import time
+
+from controllers.Controller import Controller
+from controllers.FakeController import FakeController
+from lib.Recording import Recording
+from lib.SocketClient import SocketClient
+from lib.Vehicle import Vehicle
+from lib.constants import *
+
+
+class Replay:
+    def __init__(self, recording: Recording, speed: float):
+        self.recording = recording
+        self.speed = speed
+
+    def run(self, inject) -> int:
+        """Calls inject with the source, route and message of every record at its time, returns the number sent."""
+        started = time.perf_counter()
+        first = None
+        count = 0
+
+        for timestamp, source, route, message in self.recording:
+            if first is None:
+                first = timestamp
+
+            if self.speed > 0:
+                delay = started + (timestamp - first) / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            if inject(source, route, message):
+                count += 1
+
+        return count
+
+
+class RelayTarget:
+    """Sends every message from a connection with the recorded source identity.
+
+    Messages are written straight to the connection instead of being held in the outbox of the client, so that
+    only messages that reached the relay are counted. Raises ConnectionError once a source is disconnected.
+    """
+
+    def __init__(self):
+        self.clients = {}
+
+    def __call__(self, source: str, route: str, message: str) -> bool:
+        client = self.clients.get(source)
+
+        if client is None:
+            client = SocketClient(source)
+            if not client.connect(0):
+                raise ConnectionError('Unable to connect as ' + source)
+            self.clients[source] = client
+
+        # Messages routed to the source are discarded, an empty read means that the relay closed the connection
+        readable, writable, errors = select.select([client.connection], [], [], 0)
+        if readable and not client.connection.recv(4096):
+            raise ConnectionError('Relay closed the connection of ' + source)
+
+        if not client.write([(message + SOCKET_EOL).encode()]):
+            raise ConnectionError('Lost the connection of ' + source)
+
+        return True
+
+
+class VehicleTarget:
+    """Hands the messages for vehicles to Vehicle.on_message, messages for other identities are skipped."""
+
+    def __init__(self, controller: Controller):
+        self.vehicle = Vehicle(controller)
+        self.vehicle.start()
+
+    def __call__(self, source: str, route: str, message: str) -> bool:
+        if route.partition(SOCKET_ID_SEPARATOR)[0] != SOCKET_ID_VEHICLE:
+            return False
+
+        self.vehicle.on_message(message)
+        return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording')
+    parser.add_argument('--speed', type=float, default=1, help='Replay speed, 0 replays as fast as possible')
+    parser.add_argument('--target', choices=['relay', 'vehicle'], default='relay')
+    parser.add_argument('--verbose', action='store_true', help='Print the actions of the vehicle')
+    arguments = parser.parse_args()
+
+    if arguments.target == 'vehicle':
+        target = VehicleTarget(FakeController() if arguments.verbose else Controller())
+    else:
+        target = RelayTarget()
+
+    recording = Recording(arguments.recording)
+    started = time.perf_counter()
+    try:
+        sent = Replay(recording, arguments.speed).run(target)
+    except ConnectionError as exception:
+        print('Replay stopped:', exception)
+        sys.exit(1)
+    finally:
+        recording.close()
+    elapsed = time.perf_counter() - started
+
+    print('Replayed', sent, 'messages in', round(elapsed, 3), 'seconds,', int(sent / max(elapsed, 1e-9)), 'per second')
@@ -1,46 +1,390 @@
 # noinspection PyUnresolvedReferences
-from typing import List
+from typing import Dict, FrozenSet
+from itertools import cycle
+from threading import Lock, Thread
+import random
+import signal
 import lib.settings
 from lib.ThreadedSocketServerClient import *
+from lib.SelectorLoop import SelectorLoop
+from lib.Metrics import Metrics
+from lib.Recording import Recorder
+from lib.TimerWheel import TimerWheel
+from lib import Datagram
+from lib.WorkerBus import WorkerBus, BUS_ROUTE_ADD, BUS_ROUTE_REMOVE
 
 
 class SocketServer:
-    def __init__(self):
-        self.clients: List[ThreadedSocketServerClient] = []
+    def __init__(self, mode: str = None, loops: int = None):
+        # Identified clients by route, replaced instead of mutated so broadcasts can read without locking. Clients
+        # with an instance number are reachable through their own identity and through the role they share.
+        self.routes: Dict[str, FrozenSet[SocketServerClient]] = {}
+        self.routes_lock = Lock()
         self.port = int(os.getenv('SOCKET_PORT'))
+        self.mode = mode or os.getenv('SOCKET_SERVER_MODE', SOCKET_SERVER_THREADED)
+        self.loops = loops or int(os.getenv('SOCKET_SERVER_LOOPS', 1))
+        self.queue_size = int(os.getenv('SOCKET_QUEUE_SIZE', 256))
+        self.queue_policy = os.getenv('SOCKET_QUEUE_POLICY', SOCKET_QUEUE_DROP_OLDEST)
+        self.conflate = os.getenv('SOCKET_CONFLATE', '0') == '1'
+        self.metrics = Metrics(self)
+        self.metrics_port = int(os.getenv('METRICS_PORT') or 0)
+        self.rotation = None
 
+        # Pings clients that asked for heartbeats, SOCKET_HEARTBEAT_INTERVALS overrides e.g. id_vehicle=0.1,id_joystick=1
+        self.heartbeat_intervals = dict(SOCKET_HEARTBEAT_INTERVALS)
+        for setting in filter(None, os.getenv('SOCKET_HEARTBEAT_INTERVALS', '').split(',')):
+            role, separator, interval = setting.partition('=')
+            self.heartbeat_intervals[role.strip()] = float(interval)
+        self.wheel = TimerWheel()
+
+        # Optional recording of every relayed message, see Replay.py
+        self.recorder: Recorder = None
+        self.record_path = os.getenv('SOCKET_RECORD')
+
+        # Worker processes that share the port, the bus forwards broadcasts between them
+        self.workers = int(os.getenv('SOCKET_SERVER_WORKERS', 1))
+        self.worker = None
+        self.bus: WorkerBus = None
+
+        # Clients with a UDP channel by their token
+        self.tokens: Dict[int, SocketServerClient] = {}
+
+        self.socket = None
+        self.datagram = None
+        self.bind()
+
+        # Optional Unix domain socket for clients on the same machine
+        self.unix_path = os.getenv('SOCKET_UNIX_PATH')
+        self.unix = None
+        if self.unix_path:
+            if os.path.exists(self.unix_path):
+                os.unlink(self.unix_path)
+
+            self.unix = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.unix.bind(self.unix_path)
+
+    def bind(self):
+        """Binds the sockets on the port, with several workers every worker binds sockets of its own."""
         # Create IPv4 TCP server
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.workers > 1:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.socket.bind(('0.0.0.0', self.port))
 
+        # Optional UDP socket on the same port for joystick commands
+        if os.getenv('SOCKET_UDP', '0') == '1':
+            self.datagram = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            if self.workers > 1:
+                self.datagram.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.datagram.bind(('0.0.0.0', self.port))
+
     def listen(self):
-        """Listens for connecting clients and creates a thread for each connection."""
-        self.socket.listen(5)
+        """Listens for connecting clients using the configured server mode."""
+        if self.workers > 1 and self.worker is None:
+            self.listen_workers()
+            return
+
+        # Stopping the server or a worker ends listening like an interrupt, which closes the recording and listeners
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+        self.socket.listen(socket.SOMAXCONN)
+        self.wheel.start()
+
+        print('Server is available on port', self.port, 'in', self.mode, 'mode')
+
+        if self.record_path:
+            # Workers record to a file of their own
+            path = self.record_path if self.worker is None else self.record_path + '.' + str(self.worker)
+            self.recorder = Recorder(path)
+            self.wheel.schedule(self.recorder.flush_interval, self.on_flush)
+            print('Recording relayed messages to', path)
+
+        if self.unix is not None:
+            self.unix.listen(socket.SOMAXCONN)
+            print('Server is available on', self.unix_path)
+
+        if self.metrics_port:
+            self.metrics.serve(self.metrics_port)
+
+        if self.datagram is not None:
+            print('Accepting datagrams on port', self.port)
+
+        try:
+            if self.mode == SOCKET_SERVER_SELECTOR:
+                self.listen_selector()
+            else:
+                self.listen_threaded()
+        finally:
+            self.close()
+
+    def close(self):
+        """Closes the listeners and the recording, so that stopping the server loses no recorded traffic."""
+        for listener in (self.socket, self.datagram, self.unix):
+            if listener is not None:
+                listener.close()
+
+        # Every worker removes the shared Unix domain socket, the first one to stop succeeds
+        if self.unix is not None:
+            try:
+                os.unlink(self.unix_path)
+            except FileNotFoundError:
+                pass
 
-        print('Server is available on port', self.port)
+        if self.recorder is not None:
+            self.recorder.close()
 
+    def on_flush(self):
+        """Writes the buffered records to disk every flush interval, also when no more messages are relayed."""
+        self.recorder.flush()
+        self.wheel.schedule(self.recorder.flush_interval, self.on_flush)
+
+    def listen_workers(self):
+        """Forks worker processes that accept connections on the same port, until one of them exits."""
+        ends = WorkerBus.mesh(self.workers)
+
+        # Every worker binds its own sockets, the kernel distributes new connections over them
+        self.socket.close()
+        if self.datagram is not None:
+            self.datagram.close()
+
+        children = []
+        for worker in range(self.workers):
+            pid = os.fork()
+
+            if pid == 0:
+                for other, peers in enumerate(ends):
+                    if other != worker:
+                        for connection in peers.values():
+                            connection.close()
+
+                self.serve_worker(worker, ends[worker])
+                os._exit(0)
+
+            children.append(pid)
+
+        for peers in ends:
+            for connection in peers.values():
+                connection.close()
+
+        print('Started', self.workers, 'workers')
+
+        # Stopping the server stops its workers as well
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+        try:
+            pid, status = os.wait()
+            print('Worker', pid, 'exited, stopping all workers')
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for pid in children:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+            self.close()
+
+    def serve_worker(self, worker: int, peers: dict):
+        self.worker = worker
+        self.bind()
+        self.bus = WorkerBus(self, peers)
+        self.bus.start()
+
+        # Every worker serves its own metrics on the next port
+        if self.metrics_port:
+            self.metrics_port += worker
+
+        try:
+            self.listen()
+        except KeyboardInterrupt:
+            pass
+
+    def listen_threaded(self):
+        """Creates a thread for each connection."""
+        if self.datagram is not None:
+            Thread(target=self.listen_datagram, daemon=True).start()
+
+        if self.unix is not None:
+            Thread(target=self.accept_threaded, args=(self.unix,), daemon=True).start()
+
+        self.accept_threaded(self.socket)
+
+    def accept_threaded(self, listener: socket):
         while True:
             connection = None
 
             try:
                 # Awaits incoming connections
-                connection, address = self.socket.accept()
+                connection, address = listener.accept()
             except KeyboardInterrupt:
                 if connection:
                     connection.close()
                 break
 
-            client = ThreadedSocketServerClient(self, connection)
-            self.clients.append(client)
-            client.start()
+            self.configure(connection)
+            ThreadedSocketServerClient(self, connection).start()
+
+    def listen_selector(self):
+        """Serves all connections from a fixed number of event loops, the first one runs on this thread."""
+        loops = [SelectorLoop(self, 'SelectorLoop-' + str(i)) for i in range(max(1, self.loops))]
+        self.rotation = cycle(loops)
+        loops[0].add_listener(self.socket, lambda mask: self.accept(self.socket))
 
-    def broadcast(self, identity, command: str, *params):
+        if self.unix is not None:
+            loops[0].add_listener(self.unix, lambda mask: self.accept(self.unix))
+
+        if self.datagram is not None:
+            loops[0].add_listener(self.datagram, self.receive_datagrams)
+
+        for loop in loops[1:]:
+            loop.start()
+
+        try:
+            loops[0].run()
+        except KeyboardInterrupt:
+            pass
+
+    def accept(self, listener: socket):
+        """Distributes accepted connections over the event loops."""
+        while True:
+            try:
+                connection, address = listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+
+            self.configure(connection)
+            next(self.rotation).add_connection(connection)
+
+    @staticmethod
+    def configure(connection: socket):
+        """Sends small messages right away, otherwise a command queued behind an unacknowledged ping waits for
+        the delayed acknowledgement of the client."""
+        if connection.family != socket.AF_UNIX:
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def listen_datagram(self):
+        """Receives datagrams on a thread of its own in threaded mode."""
+        while True:
+            data, address = self.datagram.recvfrom(65536)
+            self.on_datagram(data, address)
+
+    def receive_datagrams(self, mask: int):
+        while True:
+            try:
+                data, address = self.datagram.recvfrom(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+
+            self.on_datagram(data, address)
+
+    def on_datagram(self, data: bytes, address, forwarded: bool = False):
+        """Hands a datagram to the client it belongs to, datagrams with an unknown token are ignored."""
+        if len(data) < Datagram.HEADER.size:
+            return
+
+        token, sequence = Datagram.HEADER.unpack_from(data)
+        client = self.tokens.get(token)
+
+        # The client may be connected to another worker
+        if client is None and self.bus is not None and not forwarded:
+            self.bus.forward_datagram(data, address)
+        elif client is not None:
+            try:
+                client.on_datagram(sequence, data[Datagram.HEADER.size:], address)
+            except Exception as exception:
+                print('Dropping datagram of', client.identity, exception)
+
+    def open_datagram(self, client: 'SocketServerClient') -> int:
+        """Assigns a UDP channel to a client, returns the token that identifies its datagrams."""
+        with self.routes_lock:
+            token = 0
+            while not token or token in self.tokens:
+                token = random.getrandbits(32)
+
+            self.tokens[token] = client
+            return token
+
+    def register(self, client: 'SocketServerClient'):
+        """Adds an identified client to the routing table."""
+        with self.routes_lock:
+            added = [route for route in client.routes() if route not in self.routes]
+
+            for route in client.routes():
+                self.routes[route] = self.routes.get(route, frozenset()) | {client}
+
+            # Announced while holding the lock, so other workers see the changes of a route in order
+            if self.bus is not None:
+                self.bus.announce(BUS_ROUTE_ADD, added)
+
+    def unregister(self, client: 'SocketServerClient'):
+        """Removes a disconnected client from the routing table."""
+        with self.routes_lock:
+            removed = []
+
+            for route in client.routes():
+                clients = self.routes.get(route, frozenset()) - {client}
+
+                if clients:
+                    self.routes[route] = clients
+                elif self.routes.pop(route, None) is not None:
+                    removed.append(route)
+
+            if self.bus is not None:
+                self.bus.announce(BUS_ROUTE_REMOVE, removed)
+
+            if client.token:
+                self.tokens.pop(client.token, None)
+
+        # Keep the queue counters of the closed connection
+        client.metrics.dropped += client.queue.dropped
+        client.metrics.conflated += client.queue.conflated
+        self.metrics.disconnect(client.metrics)
+
+    def clients(self) -> set:
+        return {client for clients in list(self.routes.values()) for client in clients}
+
+    def queue_stats(self) -> list:
+        """Depth, high-water mark, drops and conflated messages of the outbound queue of every identified client."""
+        return [
+            (client.identity, client.queue.depth(), client.queue.high_water, client.queue.dropped,
+             client.queue.conflated)
+            for client in self.clients()
+        ]
+
+    def broadcast(self, identity, command: str, *params, forwarded: bool = False):
         # print('[BROADCAST]', identity, command, params)
-        """Broadcasts command to all clients."""
-        for client in self.clients:
-            if client.identity == identity or identity == SOCKET_BROADCAST_ALL:
-                client.send(command, params)
+        """Broadcasts command to all clients with the identity, the message is encoded once per protocol.
+
+        With several workers the broadcast is forwarded to the workers that have clients with the identity, unless
+        it was forwarded by another worker already.
+        """
+        if identity == SOCKET_BROADCAST_ALL:
+            clients = self.clients()
+        else:
+            clients = self.routes.get(identity, ())
+
+        channel = SOCKET_CONFLATE_CHANNELS.get(command) if self.conflate else None
+        datagram = command in SOCKET_DATAGRAM_COMMANDS
+
+        frames = {}
+        for client in clients:
+            if client.binary not in frames:
+                frames[client.binary] = client.encode(command, params)
+
+            data = frames[client.binary]
+            if data is None:
+                continue
+
+            # Clients with a UDP channel receive joystick commands as datagrams
+            if datagram and client.address is not None:
+                client.write_datagram(data)
+            else:
+                client.write(data, channel)
+
+        if self.bus is not None and not forwarded:
+            self.bus.forward(identity, command, params)
 
         return True
 
@@ -1,10 +1,25 @@
+from collections import Counter
+from typing import Dict
+
+
 class Actuator:
+    """Keeps the pin levels and duty cycles that were written last, so that only real changes reach the hardware.
+
+    Subclasses set pins through output and change_duty_cycle, which call write_output and write_duty_cycle only
+    when the value differs from the cached one. The number of writes and skipped writes is counted per pin.
+    """
+
     def __init__(self):
         # -1 = reverse
         # 0 = neutral
         # 1 = forward
         self.direction = 0
 
+        self.levels: Dict[int, int] = {}
+        self.duty_cycles: Dict[int, float] = {}
+        self.writes = Counter()
+        self.skipped = Counter()
+
     def forward(self, power: int = 100):
         print('Forward', power)
 
@@ -25,3 +40,32 @@ class Actuator:
         print('Exit')
 
         self.neutral()
+        print('Pin writes', dict(self.writes), 'skipped', dict(self.skipped))
+
+    def output(self, pin: int, level: int) -> bool:
+        """Sets the level of a pin, returns whether it had to be written."""
+        if self.levels.get(pin) == level:
+            self.skipped[pin] += 1
+            return False
+
+        self.write_output(pin, level)
+        self.levels[pin] = level
+        self.writes[pin] += 1
+        return True
+
+    def change_duty_cycle(self, pin: int, duty_cycle: float) -> bool:
+        """Sets the duty cycle of a PWM pin, returns whether it had to be written."""
+        if self.duty_cycles.get(pin) == duty_cycle:
+            self.skipped[pin] += 1
+            return False
+
+        self.write_duty_cycle(pin, duty_cycle)
+        self.duty_cycles[pin] = duty_cycle
+        self.writes[pin] += 1
+        return True
+
+    def write_output(self, pin: int, level: int):
+        pass
+
+    def write_duty_cycle(self, pin: int, duty_cycle: float):
+        pass
@@ -1,12 +1,13 @@
-# noinspection PyUnresolvedReferences
-import RPi.GPIO as GPIO
+from lib.gpio import GPIO
 
 from actuators.Actuator import Actuator
+from actuators.PinRegister import PinRegister
 
 
 class HBridgeActuator(Actuator):
-    def __init__(self, pin_forward: int, pin_backward: int, pin_pwm: int):
+    def __init__(self, pin_forward: int, pin_backward: int, pin_pwm: int, register: PinRegister = None):
         super().__init__()
+        self.register = register
         self.pin_forward = pin_forward
         self.pin_backward = pin_backward
         self.pin_pwm = pin_pwm
@@ -18,26 +19,28 @@ class HBridgeActuator(Actuator):
         self.power = GPIO.PWM(pin_pwm, 100)
         self.power.start(0)
 
-    def forward(self, power: int = 100):
-        if self.direction != 1:
-            GPIO.output(self.pin_forward, GPIO.HIGH)
-            GPIO.output(self.pin_backward, GPIO.LOW)
+        self.levels.update({pin_forward: GPIO.LOW, pin_backward: GPIO.LOW})
+        self.duty_cycles[pin_pwm] = 0
+
+        if register:
+            register.committed[pin_pwm] = 0
 
-        self.power.ChangeDutyCycle(power)
+    def forward(self, power: int = 100):
+        self.output(self.pin_forward, GPIO.HIGH)
+        self.output(self.pin_backward, GPIO.LOW)
+        self.change_duty_cycle(self.pin_pwm, power)
         super().forward(power)
 
     def reverse(self, power: int = 100):
-        if self.direction != -1:
-            GPIO.output(self.pin_forward, GPIO.LOW)
-            GPIO.output(self.pin_backward, GPIO.HIGH)
-
-        self.power.ChangeDutyCycle(power)
+        self.output(self.pin_forward, GPIO.LOW)
+        self.output(self.pin_backward, GPIO.HIGH)
+        self.change_duty_cycle(self.pin_pwm, power)
         super().reverse(power)
 
     def neutral(self):
-        GPIO.output(self.pin_backward, GPIO.LOW)
-        GPIO.output(self.pin_forward, GPIO.LOW)
-        self.power.ChangeDutyCycle(0)
+        self.output(self.pin_backward, GPIO.LOW)
+        self.output(self.pin_forward, GPIO.LOW)
+        self.change_duty_cycle(self.pin_pwm, 0)
 
         super().neutral()
 
@@ -45,3 +48,15 @@ class HBridgeActuator(Actuator):
         self.neutral()
         self.power.stop()
         super().exit()
+
+    def write_output(self, pin: int, level: int):
+        if self.register:
+            self.register.output(pin, level)
+        else:
+            GPIO.output(pin, level)
+
+    def write_duty_cycle(self, pin: int, duty_cycle: float):
+        if self.register:
+            self.register.change_duty_cycle(pin, self.power, duty_cycle)
+        else:
+            self.power.ChangeDutyCycle(duty_cycle)
@@ -0,0 +1,82 @@
+from threading import RLock
+from typing import Dict, Tuple
+
+from lib.gpio import GPIO
+
+
+class PinRegister:
+    """Collects the pin changes of one controller command and commits them together when the command is left.
+
+        with register:
+            left.forward(power)
+            right.forward(power)
+
+    All levels are written with a single GPIO.output call, so the direction pins of both motors change at the
+    same moment. Duty cycles that go down are written before the levels and those that go up after, so a motor
+    never runs at a higher power with the old direction. Outside a command changes are written right away.
+
+    Commands arrive from the socket, the command deadline and the disconnect handler, which run on threads of
+    their own. A command holds the lock of the register until it is committed, so commands run one after another
+    and never mix their changes.
+    """
+
+    def __init__(self):
+        self.lock = RLock()
+        self.depth = 0
+        self.levels: Dict[int, int] = {}
+        self.duty_cycles: Dict[int, Tuple[object, float]] = {}
+
+        # Duty cycle per PWM pin that was committed last
+        self.committed: Dict[int, float] = {}
+        self.commits = 0
+
+    def __enter__(self) -> 'PinRegister':
+        self.lock.acquire()
+        self.depth += 1
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        # Also committed after an exception, the actuators already consider the changes written
+        try:
+            self.depth -= 1
+            if not self.depth:
+                self.commit()
+        finally:
+            self.lock.release()
+
+    def output(self, pin: int, level: int):
+        with self.lock:
+            self.levels[pin] = level
+
+            if not self.depth:
+                self.commit()
+
+    def change_duty_cycle(self, pin: int, pwm, duty_cycle: float):
+        with self.lock:
+            self.duty_cycles[pin] = (pwm, duty_cycle)
+
+            if not self.depth:
+                self.commit()
+
+    def commit(self):
+        if not self.levels and not self.duty_cycles:
+            return
+
+        levels, self.levels = self.levels, {}
+        duty_cycles, self.duty_cycles = self.duty_cycles, {}
+        lower = [pin for pin, (pwm, duty_cycle) in duty_cycles.items() if duty_cycle < self.committed.get(pin, 0)]
+
+        for pin in lower:
+            self.write_duty_cycle(pin, *duty_cycles.pop(pin))
+
+        if levels:
+            GPIO.output(list(levels.keys()), list(levels.values()))
+
+        for pin, (pwm, duty_cycle) in duty_cycles.items():
+            self.write_duty_cycle(pin, pwm, duty_cycle)
+
+        self.commits += 1
+
+    def write_duty_cycle(self, pin: int, pwm, duty_cycle: float):
+        pwm.ChangeDutyCycle(duty_cycle)
+        self.committed[pin] = duty_cycle
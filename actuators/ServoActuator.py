@@ -1,34 +1,40 @@
-# noinspection PyUnresolvedReferences
-import RPi.GPIO as GPIO
+from lib.gpio import GPIO
 
 from actuators.Actuator import Actuator
 
 
 class ServoActuator(Actuator):
     def __init__(self, pin: int, base: int = 6, power_devision: int = 100):
+        super().__init__()
+
         GPIO.setup(pin, GPIO.OUT)
         self.power = GPIO.PWM(pin, 100)
         self.power.start(base)
 
+        self.pin = pin
         self.base = base
         self.power_division = power_devision
-
-        super().__init__()
+        self.duty_cycles[pin] = base
 
     def forward(self, power: int = 100):
         dc = self.base - (power / self.power_division)
-        self.power.ChangeDutyCycle(dc)
+        self.change_duty_cycle(self.pin, dc)
         super().forward(power)
 
     def reverse(self, power: int = 100):
         dc = self.base + (power / self.power_division)
-        self.power.ChangeDutyCycle(dc)
+        self.change_duty_cycle(self.pin, dc)
         super().reverse(power)
 
     def neutral(self):
-        self.power.ChangeDutyCycle(self.base)
+        self.change_duty_cycle(self.pin, self.base)
         super().neutral()
 
     def exit(self):
+        # Neutral while the PWM still runs, the exit of the base class then finds nothing to write
+        self.neutral()
         self.power.stop()
         super().exit()
+
+    def write_duty_cycle(self, pin: int, duty_cycle: float):
+        self.power.ChangeDutyCycle(duty_cycle)
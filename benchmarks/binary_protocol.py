@@ -0,0 +1,61 @@
+"""Compares bytes on the wire and the cost of decoding and parsing joystick commands per protocol.
+
+Parsing follows what the vehicle does with a message: split off the command and convert the speed.
+
+Usage: python -m benchmarks.binary_protocol [--messages 200000]
+"""
+import argparse
+import random
+import time
+
+from lib import BinaryProtocol
+from lib.BinaryProtocol import BinaryFrameDecoder
+from lib.constants import *
+from lib.FrameDecoder import FrameDecoder
+
+
+def parse_text(stream: bytes) -> int:
+    handled = 0
+    for message in FrameDecoder().feed(stream):
+        payload = message.split(' ')
+        command = payload.pop(0)
+        speed = int(payload[0]) if payload else 0
+        handled += 1
+
+    return handled
+
+
+def parse_binary(stream: bytes) -> int:
+    handled = 0
+    for command, params in BinaryFrameDecoder().feed(stream):
+        speed = params[0] if params else 0
+        handled += 1
+
+    return handled
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200000)
+    arguments = parser.parse_args()
+
+    random.seed(1)
+    commands = [(SOCKET_JOY_FORWARD, (random.randint(0, 100),)) if i % 2 else (SOCKET_JOY_DIR_LEFT, ())
+                for i in range(arguments.messages)]
+
+    streams = {
+        'text': ''.join(' '.join([command] + [str(param) for param in params]) + SOCKET_EOL
+                        for command, params in commands).encode(),
+        'binary': b''.join(BinaryProtocol.encode(command, params) for command, params in commands),
+    }
+
+    for protocol, parse in [('text', parse_text), ('binary', parse_binary)]:
+        started = time.perf_counter()
+        handled = parse(streams[protocol])
+        elapsed = time.perf_counter() - started
+
+        print(', '.join([
+            'protocol=' + protocol,
+            'bytes_per_message=' + str(round(len(streams[protocol]) / handled, 2)),
+            'messages_per_second=' + str(int(handled / elapsed)),
+        ]))
@@ -0,0 +1,123 @@
+"""Measures how long a received command waits in the receive loop of the vehicle and Jetson SocketClient.
+
+A raw joystick connection sends a command at random moments, the SocketClient under test listens
+as a vehicle in a process of its own and reports the (monotonic) time its callback received each
+command. Reports the latency percentiles from sending until the callback in milliseconds.
+
+Usage: python -m benchmarks.client_latency [--messages 200] [--mode selector]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from queue import Queue, Empty
+from threading import Thread
+
+from lib.constants import *
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JETSON = os.path.join(ROOT, 'services', 'Jetson-Object-Detection')
+
+# Prefix of the lines on which the listening client reports received commands, other output is skipped
+RECEIVED = 'received'
+
+
+def listen():
+    """Runs in the child process, with the lib package of the client under test on the path."""
+    from lib.SocketClient import SocketClient
+
+    client = SocketClient(SOCKET_ID_VEHICLE, heartbeat=True)
+    if not client.connect(0):
+        sys.exit(1)
+
+    def on_message(message: str):
+        sys.__stdout__.write(RECEIVED + ' ' + repr(time.monotonic()) + '\n')
+        sys.__stdout__.flush()
+
+    client.listen(on_message, reconnect=False)
+
+
+def start_client(client: str, port: int, directory: str) -> subprocess.Popen:
+    """Starts the listening vehicle, the Jetson client reads its host and port from config.yml in its directory."""
+    env = dict(os.environ, SOCKET_HOST='127.0.0.1', SOCKET_PORT=str(port), SOCKET_UNIX_PATH='', SOCKET_UDP='0')
+
+    if client == 'jetson':
+        with open(os.path.join(directory, 'config.yml'), 'w') as file:
+            json.dump({'remote_host': '127.0.0.1', 'remote_port': port}, file)
+
+    # This module is imported as a top-level module, so that lib refers to the package of the client
+    env['PYTHONPATH'] = os.pathsep.join([JETSON if client == 'jetson' else ROOT, os.path.dirname(__file__)])
+    return subprocess.Popen([sys.executable, '-c', 'import client_latency; client_latency.listen()'], env=env,
+                            cwd=directory, stdout=subprocess.PIPE, universal_newlines=True)
+
+
+def read(process: subprocess.Popen, times: Queue):
+    for line in process.stdout:
+        if line.startswith(RECEIVED):
+            times.put(float(line.split()[1]))
+
+
+def measure(client: str, port: int, messages: int, gap: float) -> list:
+    from benchmarks.relay import connect
+
+    with tempfile.TemporaryDirectory() as directory:
+        process = start_client(client, port, directory)
+        times = Queue()
+        Thread(target=read, args=(process, times), daemon=True).start()
+
+        joystick = connect(port, SOCKET_ID_JOYSTICK)
+        command = (SOCKET_JOY_FORWARD + ' 50' + SOCKET_EOL).encode()
+
+        # Commands are only relayed once the vehicle is connected
+        while True:
+            joystick.sendall(command)
+            try:
+                times.get(timeout=0.5)
+                break
+            except Empty:
+                if process.poll() is not None:
+                    raise Exception('Client stopped')
+
+        samples = []
+        for i in range(messages):
+            # Commands arrive at any moment, not right after the client handled the previous one
+            time.sleep(random.uniform(0, gap))
+
+            sent = time.monotonic()
+            joystick.sendall(command)
+            samples.append(times.get(timeout=10) - sent)
+
+        joystick.close()
+        process.terminate()
+        process.wait()
+
+    return sorted(samples)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--gap', type=float, default=0.05, help='Maximum random pause between commands in seconds')
+    parser.add_argument('--mode', default=SOCKET_SERVER_SELECTOR)
+    parser.add_argument('--port', type=int, default=5650)
+    arguments = parser.parse_args()
+
+    from benchmarks.relay import start_server, stop_server, percentile
+
+    server = start_server(arguments.port, SOCKET_SERVER_MODE=arguments.mode)
+
+    try:
+        for client in ['vehicle', 'jetson']:
+            samples = measure(client, arguments.port, arguments.messages, arguments.gap)
+            print(', '.join([
+                'client=' + client,
+                'p50_ms=' + str(round(percentile(samples, 0.5) * 1000, 3)),
+                'p99_ms=' + str(round(percentile(samples, 0.99) * 1000, 3)),
+                'max_ms=' + str(round(percentile(samples, 1) * 1000, 3)),
+            ]))
+    finally:
+        stop_server(server)
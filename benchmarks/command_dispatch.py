@@ -0,0 +1,104 @@
+"""Measures the cost of dispatching a received message to its handler.
+
+Compares the if-chain the vehicle used to check every message against, with the dispatch table
+built from the command registry for text messages and for commands decoded from binary frames.
+
+Usage: python -m benchmarks.command_dispatch [--messages 200000]
+"""
+import argparse
+import random
+import time
+
+from lib.commands import COMMANDS
+from lib.constants import *
+
+
+# Commands the if-chain handles, the registry also holds commands that the vehicle handles elsewhere
+LEGACY_COMMANDS = [SOCKET_JOY_FORWARD, SOCKET_JOY_BACKWARD, SOCKET_JOY_NEUTRAL, SOCKET_JOY_DIR_NEUTRAL,
+                   SOCKET_JOY_DIR_LEFT, SOCKET_JOY_DIR_RIGHT, SOCKET_RECOGNITION_DETECTED, SOCKET_RECOGNITION_FREE]
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, *params):
+        self.calls += 1
+
+
+def if_chain(handle: Counter):
+    """Dispatching as done by Vehicle.on_message before the command registry."""
+
+    def on_message(message: str):
+        payload = message.split(' ')
+
+        command = message
+        if len(payload) >= 1:
+            command = payload[0]
+            del payload[0]
+
+        speed = 0
+        if len(payload) >= 1:
+            speed = int(payload[0])
+
+        if command == SOCKET_JOY_FORWARD:
+            handle(speed)
+
+        if command == SOCKET_JOY_BACKWARD:
+            handle(speed)
+
+        if command == SOCKET_JOY_NEUTRAL:
+            handle()
+
+        if command == SOCKET_JOY_DIR_NEUTRAL:
+            handle()
+
+        if command == SOCKET_JOY_DIR_LEFT:
+            handle()
+
+        if command == SOCKET_JOY_DIR_RIGHT:
+            handle()
+
+        if command == SOCKET_RECOGNITION_DETECTED:
+            handle()
+
+        if command == SOCKET_RECOGNITION_FREE:
+            handle()
+
+    return on_message
+
+
+def measure(name: str, dispatch, messages: list, handle: Counter):
+    started = time.perf_counter()
+    for message in messages:
+        dispatch(message)
+    elapsed = time.perf_counter() - started
+
+    assert handle.calls == len(messages)
+    print('dispatch=' + name + ', ns_per_message=' + str(int(elapsed / len(messages) * 1e9)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200000)
+    arguments = parser.parse_args()
+
+    random.seed(1)
+    names = LEGACY_COMMANDS
+    commands = []
+    for i in range(arguments.messages):
+        name = random.choice(names)
+        commands.append((name, (random.randint(0, 100),) if COMMANDS.get(name).params else ()))
+
+    texts = [' '.join([name] + [str(param) for param in params]) for name, params in commands]
+
+    handle = Counter()
+    measure('if_chain', if_chain(handle), texts, handle)
+
+    handle = Counter()
+    dispatcher = COMMANDS.dispatcher({name: handle for name in names})
+    measure('registry_text', dispatcher, texts, handle)
+
+    handle = Counter()
+    dispatcher = COMMANDS.dispatcher({name: handle for name in names})
+    measure('registry_binary', lambda command: dispatcher.command(*command), commands, handle)
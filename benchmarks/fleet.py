@@ -0,0 +1,77 @@
+"""Scaling test of one SocketServer serving a fleet of addressable vehicles.
+
+Connects pairs of id_joystick@N and id_vehicle@N, every joystick drives its own vehicle and an
+unscoped recognition client stops all of them. Verifies that every vehicle only receives the
+commands of its own joystick, and reports the messages per second delivered.
+
+With --workers the server forks worker processes, joysticks and vehicles then end up at different
+workers and their commands travel over the worker bus.
+
+Usage: python -m benchmarks.fleet [--vehicles 50] [--messages 2000] [--mode selector] [--workers 1]
+"""
+import argparse
+import selectors
+import time
+
+from benchmarks.relay import start_server, stop_server, connect, instance
+from lib.constants import *
+from lib.FrameDecoder import FrameDecoder
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vehicles', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=2000, help='Messages sent by every joystick')
+    parser.add_argument('--mode', default=SOCKET_SERVER_SELECTOR)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--port', type=int, default=5620)
+    arguments = parser.parse_args()
+
+    server = start_server(arguments.port, SOCKET_SERVER_MODE=arguments.mode, SOCKET_QUEUE_SIZE=100000,
+                          SOCKET_SERVER_WORKERS=arguments.workers)
+
+    try:
+        vehicles = [connect(arguments.port, instance(i, SOCKET_ID_VEHICLE)) for i in range(arguments.vehicles)]
+        joysticks = [connect(arguments.port, instance(i, SOCKET_ID_JOYSTICK)) for i in range(arguments.vehicles)]
+        recognition = connect(arguments.port, SOCKET_ID_RECOGNITION)
+
+        selector = selectors.DefaultSelector()
+        for number, vehicle in enumerate(vehicles):
+            selector.register(vehicle, selectors.EVENT_READ, (number, FrameDecoder()))
+
+        # Every joystick sends its own instance number as speed
+        commands = [(SOCKET_JOY_FORWARD + ' ' + str(i) + SOCKET_EOL).encode() * 100 for i in range(arguments.vehicles)]
+        expected = arguments.vehicles * (arguments.messages // 100 * 100 + 1)
+        delivered = misrouted = 0
+
+        started = finished = time.perf_counter()
+        for batch in range(arguments.messages // 100):
+            for number, joystick in enumerate(joysticks):
+                joystick.sendall(commands[number])
+        recognition.sendall((SOCKET_RECOGNITION_DETECTED + SOCKET_EOL).encode())
+
+        while delivered + misrouted < expected:
+            events = selector.select(5)
+            if not events:
+                break
+
+            for key, mask in events:
+                number, decoder = key.data
+                for message in decoder.feed(key.fileobj.recv(65536)):
+                    if message == SOCKET_RECOGNITION_DETECTED or message.split()[1] == str(number):
+                        delivered += 1
+                    else:
+                        misrouted += 1
+            finished = time.perf_counter()
+
+        print(', '.join([
+            'mode=' + arguments.mode,
+            'workers=' + str(arguments.workers),
+            'vehicles=' + str(arguments.vehicles),
+            'expected=' + str(expected),
+            'delivered=' + str(delivered),
+            'misrouted=' + str(misrouted),
+            'messages_per_second=' + str(int(delivered / (finished - started))),
+        ]))
+    finally:
+        stop_server(server)
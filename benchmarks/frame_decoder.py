@@ -0,0 +1,68 @@
+"""Measures the throughput of the FrameDecoder against decoding and splitting every received chunk.
+
+A stream of joystick commands is cut into chunks of random size, the way recv returns them under
+load. Reports messages per second and how many messages came out corrupted for both approaches.
+
+Usage: python -m benchmarks.frame_decoder [--messages 200000] [--chunk 1024]
+"""
+import argparse
+import random
+import time
+
+from lib.constants import *
+from lib.FrameDecoder import FrameDecoder
+
+
+def legacy(chunks) -> list:
+    messages = []
+    for chunk in chunks:
+        messages.extend(chunk.decode().strip(SOCKET_EOL).split(SOCKET_EOL))
+
+    return messages
+
+
+def framed(chunks) -> list:
+    decoder = FrameDecoder()
+    messages = []
+    for chunk in chunks:
+        messages.extend(decoder.feed(chunk))
+
+    return messages
+
+
+def measure(function, chunks, sent: list) -> dict:
+    started = time.perf_counter()
+    received = function(chunks)
+    elapsed = time.perf_counter() - started
+
+    valid = set(sent)
+    corrupted = sum(1 for message in received if message not in valid) + max(0, len(sent) - len(received))
+
+    return {
+        'decoder': function.__name__,
+        'messages_per_second': int(len(received) / elapsed),
+        'corrupted': corrupted,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--chunk', type=int, default=1024, help='Maximum size of a chunk returned by recv')
+    arguments = parser.parse_args()
+
+    random.seed(1)
+    sent = [random.choice([SOCKET_JOY_FORWARD, SOCKET_JOY_BACKWARD]) + ' ' + str(random.randint(0, 100))
+            for i in range(arguments.messages)]
+    stream = (SOCKET_EOL.join(sent) + SOCKET_EOL).encode()
+
+    chunks = []
+    position = 0
+    while position < len(stream):
+        size = random.randint(1, arguments.chunk)
+        chunks.append(stream[position:position + size])
+        position += size
+
+    for function in [legacy, framed]:
+        result = measure(function, chunks, sent)
+        print(', '.join(key + '=' + str(value) for key, value in result.items()))
@@ -0,0 +1,220 @@
+"""Load generator for the SocketServer, sweeps message rates and reports throughput, drops and latency.
+
+Starts N synthetic joysticks, M synthetic vehicles and K synthetic recognizers that speak the text
+protocol. Joystick i drives the vehicle with instance number i % M, recognizers reach all vehicles.
+Every joystick command carries a unique number so the vehicles can look up when it was sent.
+
+Every run is stored in benchmarks/results and compared with the previous run with the same settings,
+so that regressions show up as a change in throughput or latency.
+
+Usage: python -m benchmarks.load [--joysticks 10] [--vehicles 10] [--recognizers 1] [--rates 1000,5000,20000]
+                                 [--duration 5] [--mode selector] [--workers 1]
+"""
+import argparse
+import json
+import os
+import selectors
+import time
+from itertools import count
+from threading import Thread
+
+from benchmarks.relay import start_server, stop_server, connect, instance, percentile
+from lib.constants import *
+from lib.FrameDecoder import FrameDecoder
+
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+class Load:
+    """Synthetic clients of one run at a fixed rate of joystick commands per second."""
+
+    def __init__(self, port: int, joysticks: int, vehicles: int, recognizers: int, rate: int,
+                 recognition_rate: float):
+        self.vehicles = [connect(port, instance(i, SOCKET_ID_VEHICLE)) for i in range(vehicles)]
+        self.joysticks = [connect(port, instance(i % vehicles, SOCKET_ID_JOYSTICK)) for i in range(joysticks)]
+        self.recognizers = [connect(port, SOCKET_ID_RECOGNITION) for i in range(recognizers)]
+        self.rate = rate
+        self.recognition_rate = recognition_rate
+
+        self.numbers = count()
+        self.sent = {}
+        self.recognitions = 0
+        self.recognitions_received = 0
+        self.latencies = []
+        self.received = 0
+        self.delivered = 0.0
+        self.finished = False
+
+    def send(self, duration: float):
+        """Sends the commands that are due every millisecond, spread over the joysticks."""
+        started = time.perf_counter()
+        sent = 0
+        recognitions = 0
+        recognition = [SOCKET_RECOGNITION_DETECTED, SOCKET_RECOGNITION_FREE]
+
+        while True:
+            elapsed = time.perf_counter() - started
+            if elapsed >= duration:
+                break
+
+            due = int(elapsed * self.rate) - sent
+            batches = [[] for joystick in self.joysticks]
+            for i in range(due):
+                number = next(self.numbers)
+                batches[number % len(batches)].append(SOCKET_JOY_FORWARD + ' ' + str(number) + SOCKET_EOL)
+                self.sent[number] = time.perf_counter()
+            sent += due
+
+            for joystick, batch in zip(self.joysticks, batches):
+                if batch:
+                    joystick.sendall(''.join(batch).encode())
+
+            if self.recognizers and int(elapsed * self.recognition_rate) > recognitions:
+                for recognizer in self.recognizers:
+                    recognizer.sendall((recognition[recognitions % 2] + SOCKET_EOL).encode())
+                recognitions += 1
+                self.recognitions += len(self.recognizers)
+
+            time.sleep(0.001)
+
+        self.finished = True
+
+    def receive(self, drain: float):
+        """Receives at the vehicles until everything arrived or nothing arrived for the drain period."""
+        selector = selectors.DefaultSelector()
+        for vehicle in self.vehicles:
+            selector.register(vehicle, selectors.EVENT_READ, FrameDecoder())
+
+        recognitions = 0
+        while True:
+            finished = self.finished
+            events = selector.select(drain if finished else 0.1)
+            if not events and finished:
+                break
+
+            for key, mask in events:
+                data = key.fileobj.recv(65536)
+                now = time.perf_counter()
+
+                for message in key.data.feed(data):
+                    command, separator, number = message.partition(' ')
+
+                    if command == SOCKET_JOY_FORWARD:
+                        sent = self.sent.pop(int(number), None)
+                        if sent is not None:
+                            self.latencies.append(now - sent)
+                            self.received += 1
+                            self.delivered = now
+                    elif command in (SOCKET_RECOGNITION_DETECTED, SOCKET_RECOGNITION_FREE):
+                        recognitions += 1
+
+            if self.finished and not self.sent and recognitions >= self.recognitions * len(self.vehicles):
+                break
+
+        self.recognitions_received = recognitions
+
+    def run(self, duration: float, drain: float = 2) -> dict:
+        sender = Thread(target=self.send, args=(duration,), daemon=True)
+        started = time.perf_counter()
+        sender.start()
+        self.receive(drain)
+        elapsed = max(self.delivered - started, 1e-9)
+        sender.join()
+
+        for connection in self.vehicles + self.joysticks + self.recognizers:
+            connection.close()
+
+        expected = self.received + len(self.sent)
+        latencies = sorted(self.latencies) or [0]
+        return {
+            'rate': self.rate,
+            'sent': expected,
+            'delivered': self.received,
+            'dropped': len(self.sent),
+            'recognitions_dropped': self.recognitions * len(self.vehicles) - self.recognitions_received,
+            'messages_per_second': int(self.received / elapsed),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'p999_ms': round(percentile(latencies, 0.999) * 1000, 3),
+        }
+
+
+def previous(settings: dict) -> dict:
+    """Latest stored run with the same settings."""
+    if not os.path.isdir(RESULTS):
+        return None
+
+    for name in sorted(os.listdir(RESULTS), reverse=True):
+        with open(os.path.join(RESULTS, name)) as file:
+            run = json.load(file)
+
+        if run['settings'] == settings:
+            return run
+
+    return None
+
+
+def store(settings: dict, results: list) -> str:
+    os.makedirs(RESULTS, exist_ok=True)
+    path = os.path.join(RESULTS, 'load-' + time.strftime('%Y%m%d-%H%M%S') + '.json')
+
+    with open(path, 'w') as file:
+        json.dump({'time': time.time(), 'settings': settings, 'results': results}, file, indent=2)
+
+    return path
+
+
+def change(result: dict, before: dict, key: str) -> str:
+    if not before or not before.get(key):
+        return ''
+
+    return ' (' + '{:+.1f}'.format((result[key] - before[key]) / before[key] * 100) + '%)'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--joysticks', type=int, default=10)
+    parser.add_argument('--vehicles', type=int, default=10)
+    parser.add_argument('--recognizers', type=int, default=1)
+    parser.add_argument('--rates', default='1000,5000,20000', help='Joystick commands per second, comma separated')
+    parser.add_argument('--recognition-rate', type=float, default=2, help='Messages per second of every recognizer')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds every rate is sent')
+    parser.add_argument('--mode', default=SOCKET_SERVER_SELECTOR)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--queue', type=int, default=256, help='Outbound queue size of the server')
+    parser.add_argument('--port', type=int, default=5640)
+    parser.add_argument('--no-store', action='store_true', help='Do not store the results of this run')
+    arguments = parser.parse_args()
+
+    settings = {key: value for key, value in vars(arguments).items() if key not in ('port', 'no_store')}
+    before = previous(settings)
+    before_results = {result['rate']: result for result in before['results']} if before else {}
+
+    server = start_server(arguments.port, SOCKET_SERVER_MODE=arguments.mode, SOCKET_SERVER_WORKERS=arguments.workers,
+                          SOCKET_QUEUE_SIZE=arguments.queue)
+
+    results = []
+    try:
+        for rate in [int(rate) for rate in arguments.rates.split(',')]:
+            load = Load(arguments.port, arguments.joysticks, arguments.vehicles, arguments.recognizers, rate,
+                        arguments.recognition_rate)
+            result = load.run(arguments.duration)
+            results.append(result)
+
+            compared = before_results.get(rate)
+            print(', '.join([
+                'rate=' + str(rate),
+                'delivered=' + str(result['delivered']),
+                'dropped=' + str(result['dropped']),
+                'recognitions_dropped=' + str(result['recognitions_dropped']),
+                'messages_per_second=' + str(result['messages_per_second']) +
+                change(result, compared, 'messages_per_second'),
+                'p50_ms=' + str(result['p50_ms']) + change(result, compared, 'p50_ms'),
+                'p99_ms=' + str(result['p99_ms']) + change(result, compared, 'p99_ms'),
+                'p999_ms=' + str(result['p999_ms']) + change(result, compared, 'p999_ms'),
+            ]))
+    finally:
+        stop_server(server)
+
+    if not arguments.no_store:
+        print('Stored results in', store(settings, results))
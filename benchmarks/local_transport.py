@@ -0,0 +1,61 @@
+"""Measures the latency of relaying a command between two clients on the same machine over TCP and Unix sockets.
+
+A joystick sends a command and waits until the vehicle received it before sending the next one,
+so every sample is the one-way latency through the server. Reports the latency percentiles in
+microseconds and the messages per second a single joystick achieves this way.
+
+Usage: python -m benchmarks.local_transport [--messages 5000] [--mode selector]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.relay import start_server, stop_server, connect, percentile
+from lib.constants import *
+
+
+def measure(port: int, messages: int, path: str = None) -> list:
+    vehicle = connect(port, SOCKET_ID_VEHICLE, path)
+    joystick = connect(port, SOCKET_ID_JOYSTICK, path)
+    command = (SOCKET_JOY_FORWARD + ' 50' + SOCKET_EOL).encode()
+
+    samples = []
+    for i in range(messages):
+        started = time.perf_counter()
+        joystick.sendall(command)
+
+        received = b''
+        while len(received) < len(command):
+            received += vehicle.recv(4096)
+
+        samples.append(time.perf_counter() - started)
+
+    vehicle.close()
+    joystick.close()
+    return sorted(samples)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--mode', default=SOCKET_SERVER_SELECTOR)
+    parser.add_argument('--port', type=int, default=5630)
+    arguments = parser.parse_args()
+
+    path = os.path.join(tempfile.gettempdir(), 'smarterdam-benchmark.sock')
+    server = start_server(arguments.port, SOCKET_SERVER_MODE=arguments.mode, SOCKET_UNIX_PATH=path)
+
+    try:
+        for transport, socket_path in [('tcp', None), ('unix', path)]:
+            samples = measure(arguments.port, arguments.messages, socket_path)
+            print(', '.join([
+                'mode=' + arguments.mode,
+                'transport=' + transport,
+                'p50_us=' + str(int(percentile(samples, 0.5) * 1e6)),
+                'p99_us=' + str(int(percentile(samples, 0.99) * 1e6)),
+                'p999_us=' + str(int(percentile(samples, 0.999) * 1e6)),
+                'messages_per_second=' + str(int(len(samples) / sum(samples))),
+            ]))
+    finally:
+        stop_server(server)
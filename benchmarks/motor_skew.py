@@ -0,0 +1,103 @@
+"""Measures the write cost of an HBridgeController command and the skew between its two motors.
+
+The controller runs on the simulated GPIO backend, with every GPIO call taking the given latency. Each
+command of a random sequence of speed changes is applied once with the pin register, which commits the
+changes of both motors together, and once with every actuator writing its own pins. Reports the GPIO
+calls and microseconds per command, and the percentiles of the skew: the time between the left and the
+right motor reaching their new state.
+
+Usage: python -m benchmarks.motor_skew [--commands 2000] [--output-latency 0.00002] [--pwm-latency 0.00002]
+"""
+import argparse
+import contextlib
+import os
+import random
+import time
+
+from benchmarks.relay import percentile
+from benchmarks.vehicle_commands import PINS
+
+
+def commands(count: int) -> list:
+    """Speed commands of which every one changes the power or direction of the motors."""
+    random.seed(1)
+    speeds = []
+    speed = 0
+
+    while len(speeds) < count:
+        changed = random.choice([-100, -60, -30, 0, 30, 60, 100])
+        if changed != speed:
+            speeds.append(changed)
+            speed = changed
+
+    return speeds
+
+
+def apply(controller, speed: int):
+    if speed > 0:
+        controller.forward(speed)
+    elif speed < 0:
+        controller.reverse(-speed)
+    else:
+        controller.neutral()
+
+
+def measure(name: str, controller, speeds: list):
+    from lib.gpio import GPIO
+
+    left = {controller.left.pin_forward, controller.left.pin_backward, controller.left.pin_pwm}
+    right = {controller.right.pin_forward, controller.right.pin_backward, controller.right.pin_pwm}
+    costs = []
+    skews = []
+    calls = 0
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for speed in speeds:
+            GPIO.reset()
+
+            started = time.perf_counter()
+            apply(controller, speed)
+            costs.append(time.perf_counter() - started)
+            calls += GPIO.calls
+
+            # A motor reached its new state with the last change of one of its pins
+            left_done = max(event.time for event in GPIO.timeline if event.pin in left)
+            right_done = max(event.time for event in GPIO.timeline if event.pin in right)
+            skews.append(abs(left_done - right_done))
+
+    costs.sort()
+    skews.sort()
+    print(', '.join([
+        'writes=' + name,
+        'gpio_calls_per_command=' + str(round(calls / len(speeds), 2)),
+        'us_per_command=' + str(round(sum(costs) / len(costs) * 1e6, 1)),
+        'skew_p50_us=' + str(round(percentile(skews, 0.5) * 1e6, 1)),
+        'skew_p99_us=' + str(round(percentile(skews, 0.99) * 1e6, 1)),
+        'skew_max_us=' + str(round(percentile(skews, 1) * 1e6, 1)),
+    ]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--commands', type=int, default=2000)
+    parser.add_argument('--output-latency', type=float, default=0.00002, help='Seconds a GPIO.output call takes')
+    parser.add_argument('--pwm-latency', type=float, default=0.00002, help='Seconds a ChangeDutyCycle call takes')
+    arguments = parser.parse_args()
+
+    for key, value in PINS.items():
+        os.environ.setdefault(key, value)
+
+    os.environ.update(GPIO_BACKEND='simulated', GPIO_OUTPUT_LATENCY=str(arguments.output_latency),
+                      GPIO_PWM_LATENCY=str(arguments.pwm_latency))
+
+    from controllers.HBridgeController import HBridgeController
+
+    speeds = commands(arguments.commands)
+    measure('register', HBridgeController(), speeds)
+
+    # The same controller with every actuator writing its own pins right away
+    controller = HBridgeController()
+    for actuator in [controller.left, controller.right, controller.steering]:
+        actuator.register = None
+
+    measure('direct', controller, speeds)
@@ -0,0 +1,65 @@
+"""Helpers shared by the benchmarks, most of which run against a SocketServer process."""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from lib.constants import *
+
+
+def start_server(port: int, **settings) -> subprocess.Popen:
+    """Starts SocketServer.py with the given environmental variables and waits until it accepts connections."""
+    env = dict(os.environ, SOCKET_PORT=str(port), **{key: str(value) for key, value in settings.items()})
+    process = subprocess.Popen([sys.executable, 'SocketServer.py'], env=env, stdout=subprocess.DEVNULL)
+
+    for i in range(100):
+        try:
+            connect(port, SOCKET_ID_FAKE).close()
+            return process
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+
+    process.kill()
+    raise Exception('Server did not start')
+
+
+def stop_server(process: subprocess.Popen):
+    """Terminates the server, which also stops the worker processes it started."""
+    process.terminate()
+    process.wait()
+
+
+def connect(port: int, identity: str, path: str = None) -> socket:
+    """Connects a raw socket, over the Unix domain socket at path if given, and completes the identity handshake."""
+    if path:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(path)
+    else:
+        connection = socket.create_connection(('127.0.0.1', port))
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    connection.sendall((identity + SOCKET_EOL).encode())
+    connection.recv(1024)
+    return connection
+
+
+def instance(number: int, identity: str) -> str:
+    """Identity of the given instance number, e.g. id_vehicle@2."""
+    return identity + SOCKET_ID_SEPARATOR + str(number)
+
+
+def percentile(samples: list, q: float) -> float:
+    """Sample at the given quantile of sorted samples, 1 is the maximum."""
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def process_status(pid: int) -> dict:
+    """Thread count and resident memory of a process, as reported by Linux."""
+    status = {}
+    with open('/proc/' + str(pid) + '/status') as file:
+        for line in file:
+            key, value = line.split(':', 1)
+            status[key] = value.strip()
+
+    return {'threads': int(status['Threads']), 'rss_kb': int(status['VmRSS'].split()[0])}
@@ -0,0 +1,87 @@
+"""Compares the threaded and selector modes of the SocketServer.
+
+Starts the server in a separate process for every mode, opens a number of idle connections and
+lets joysticks flood all connected vehicles. Reports the connections held, the server's thread
+count and memory, and the number of messages per second delivered to the vehicles.
+
+Usage: python -m benchmarks.server_modes [--idle 200] [--vehicles 10] [--joysticks 2] [--messages 5000]
+"""
+import argparse
+import selectors
+import time
+from threading import Thread
+
+from benchmarks.relay import start_server, stop_server, connect, process_status
+from lib.constants import *
+
+MESSAGE = (SOCKET_JOY_FORWARD + ' 50' + SOCKET_EOL).encode()
+
+
+def flood(connection, messages: int):
+    batch = MESSAGE * 100
+    for i in range(messages // 100):
+        connection.sendall(batch)
+
+
+def run(mode: str, port: int, arguments) -> dict:
+    server = start_server(port, SOCKET_SERVER_MODE=mode, SOCKET_SERVER_LOOPS=arguments.loops,
+                          SOCKET_QUEUE_SIZE=arguments.queue)
+
+    try:
+        idle = [connect(port, SOCKET_ID_FAKE) for i in range(arguments.idle)]
+        vehicles = [connect(port, SOCKET_ID_VEHICLE) for i in range(arguments.vehicles)]
+        joysticks = [connect(port, SOCKET_ID_JOYSTICK) for i in range(arguments.joysticks)]
+        time.sleep(0.5)
+        status = process_status(server.pid)
+
+        expected = len(MESSAGE) * arguments.vehicles * arguments.joysticks * (arguments.messages // 100 * 100)
+        received = 0
+
+        selector = selectors.DefaultSelector()
+        for vehicle in vehicles:
+            selector.register(vehicle, selectors.EVENT_READ)
+
+        started = finished = time.perf_counter()
+        for joystick in joysticks:
+            Thread(target=flood, args=(joystick, arguments.messages), daemon=True).start()
+
+        while received < expected:
+            events = selector.select(5)
+            if not events:
+                break
+
+            for key, mask in events:
+                received += len(key.fileobj.recv(65536))
+            finished = time.perf_counter()
+
+        elapsed = finished - started
+
+        for connection in idle + vehicles + joysticks:
+            connection.close()
+
+        return dict(
+            status,
+            mode=mode,
+            connections=len(idle) + len(vehicles) + len(joysticks),
+            expected=expected // len(MESSAGE),
+            delivered=received // len(MESSAGE),
+            messages_per_second=int(received // len(MESSAGE) / elapsed),
+        )
+    finally:
+        stop_server(server)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--idle', type=int, default=200, help='Idle connections held open during the run')
+    parser.add_argument('--vehicles', type=int, default=10)
+    parser.add_argument('--joysticks', type=int, default=2)
+    parser.add_argument('--messages', type=int, default=5000, help='Messages sent by every joystick')
+    parser.add_argument('--loops', type=int, default=1, help='Event loops used in selector mode')
+    parser.add_argument('--queue', type=int, default=100000, help='Outbound queue size, small queues drop messages')
+    parser.add_argument('--port', type=int, default=5600)
+    arguments = parser.parse_args()
+
+    for i, mode in enumerate([SOCKET_SERVER_THREADED, SOCKET_SERVER_SELECTOR]):
+        result = run(mode, arguments.port + i, arguments)
+        print(', '.join(key + '=' + str(value) for key, value in result.items()))
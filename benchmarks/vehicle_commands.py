@@ -0,0 +1,116 @@
+"""Measures the command path of PinkVehicle and ServoVehicle, from a received message to the GPIO pins.
+
+The vehicles run on the simulated GPIO backend, which records every pin change and can spend the time a
+GPIO call takes on the Raspberry Pi. A joystick-like stream of commands is handed to the vehicle as if it
+was received, with the control loop disabled so that every command is applied right away. Reports the cost
+per command and the GPIO calls per command, and checks that the pins end in the state of the last command.
+
+Usage: python -m benchmarks.vehicle_commands [--messages 20000] [--output-latency 0.00002]
+"""
+import argparse
+import contextlib
+import os
+import random
+import time
+
+from lib.constants import *
+
+# Pins of .env.example, the vehicles read them while they are created
+PINS = {
+    'PIN_LEFT_FORWARD': '36', 'PIN_LEFT_BACKWARD': '38', 'PIN_LEFT_PWM': '40',
+    'PIN_RIGHT_FORWARD': '33', 'PIN_RIGHT_BACKWARD': '35', 'PIN_RIGHT_PWM': '37',
+    'PIN_STEER_LEFT': '11', 'PIN_STEER_RIGHT': '13', 'PIN_STEER_PWM': '15',
+    'PIN_SERVO_PWM': '4',
+}
+
+
+def joystick(messages: int) -> list:
+    """Commands as a joystick sends them, mostly the same power and steering again with an occasional change."""
+    random.seed(1)
+    speed = 0
+    steering = SOCKET_JOY_DIR_NEUTRAL
+    commands = []
+
+    for i in range(messages):
+        if random.random() < 0.1:
+            speed = max(-100, min(100, speed + random.choice([-10, -5, 5, 10])))
+        if random.random() < 0.05:
+            steering = random.choice([SOCKET_JOY_DIR_LEFT, SOCKET_JOY_DIR_RIGHT, SOCKET_JOY_DIR_NEUTRAL])
+
+        if speed > 0:
+            commands.append(SOCKET_JOY_FORWARD + ' ' + str(speed))
+        elif speed < 0:
+            commands.append(SOCKET_JOY_BACKWARD + ' ' + str(-speed))
+        else:
+            commands.append(SOCKET_JOY_NEUTRAL)
+
+        commands.append(steering)
+
+    return commands
+
+
+def measure(name: str, vehicle, commands: list):
+    from lib.gpio import GPIO
+
+    GPIO.reset()
+
+    # Printing is part of the command path, but the benchmark output should stay readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        for command in commands:
+            vehicle.on_message(command)
+        elapsed = time.perf_counter() - started
+
+    print(', '.join([
+        'vehicle=' + name,
+        'us_per_command=' + str(round(elapsed / len(commands) * 1e6, 2)),
+        'gpio_calls_per_command=' + str(round(GPIO.calls / len(commands), 3)),
+        'pin_changes=' + str(GPIO.changes),
+    ]))
+
+
+def expect(controller, last_speed: str):
+    """Checks that the pins of the motors end in the state of the last speed command."""
+    from lib.gpio import GPIO
+
+    command, _, power = last_speed.partition(' ')
+    duty_cycle = int(power) if power else 0
+    forward = GPIO.HIGH if command == SOCKET_JOY_FORWARD else GPIO.LOW
+    backward = GPIO.HIGH if command == SOCKET_JOY_BACKWARD else GPIO.LOW
+
+    for actuator in [controller.left, controller.right]:
+        assert GPIO.levels[actuator.pin_forward] == forward
+        assert GPIO.levels[actuator.pin_backward] == backward
+        assert GPIO.duty_cycles[actuator.pin_pwm] == duty_cycle
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=20000, help='Speed and steering command pairs')
+    parser.add_argument('--output-latency', type=float, default=0.0, help='Seconds a GPIO.output call takes')
+    parser.add_argument('--pwm-latency', type=float, default=0.0, help='Seconds a ChangeDutyCycle call takes')
+    arguments = parser.parse_args()
+
+    for key, value in PINS.items():
+        os.environ.setdefault(key, value)
+
+    os.environ.update(GPIO_BACKEND='simulated', GPIO_OUTPUT_LATENCY=str(arguments.output_latency),
+                      GPIO_PWM_LATENCY=str(arguments.pwm_latency), VEHICLE_CONTROL_RATE='0', SOCKET_TRACE='0',
+                      SOCKET_PROTOCOL='text', SOCKET_PORT=os.getenv('SOCKET_PORT') or '5555')
+
+    from PinkVehicle import PinkVehicle
+    from ServoVehicle import ServoVehicle
+
+    commands = joystick(arguments.messages)
+
+    pink = PinkVehicle()
+    measure('pink', pink, commands)
+    speeds = [SOCKET_JOY_FORWARD, SOCKET_JOY_BACKWARD, SOCKET_JOY_NEUTRAL]
+    expect(pink.controller, [command for command in commands if command.partition(' ')[0] in speeds][-1])
+
+    servo = ServoVehicle()
+    measure('servo', servo, commands)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        pink.controller.exit()
+        servo.controller.exit()
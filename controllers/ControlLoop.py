@@ -0,0 +1,179 @@
+import time
+from threading import Thread, Event
+
+from controllers.Controller import Controller
+
+
+class ControlLoop(Controller, Thread):
+    """Applies the latest desired state to a controller at a fixed rate, on a thread of its own.
+
+    Commands only publish the desired speed and steering. Every tick the loop moves the applied state
+    towards it within the rate limits and only writes the actuators when that changed, so they are
+    written at a fixed cadence no matter how bursty commands arrive. Slowing down is never limited and
+    neutral is applied right away instead of at the next tick.
+
+    A tick that fails puts the controller in neutral and the loop keeps running, so the failsafes of the
+    vehicle still reach the actuators. Neutral is written to the controller directly when the loop is not
+    running.
+    """
+
+    def __init__(self, controller: Controller, rate: float = 100, max_acceleration: float = 0,
+                 steering_rate: float = 0):
+        Thread.__init__(self, name='ControlLoop')
+        self.daemon = True
+
+        self.controller = controller
+        self.interval = 1 / rate
+
+        # Power per second and steering steps (left, neutral, right) per second, 0 is unlimited
+        self.max_acceleration = max_acceleration
+        self.steering_rate = steering_rate
+
+        # Desired state, power from -100 (reverse) to 100 (forward) and steering -1 (left), 0 or 1 (right)
+        self.speed = 0
+        self.steering = 0
+        self.wakeup = Event()
+        self.running = True
+
+        # State written to the controller
+        self.applied_speed = 0.0
+        self.written_speed = 0
+        self.applied_steering = 0
+        self.steered = 0.0
+
+        self.ticks = 0
+        self.writes = 0
+
+        # Every command increments the version, a tick commits the version it started with and reports it with
+        # the time its writes were done to on_commit, e.g. to trace when a command reached the actuators
+        self.version = 0
+        self.committed = 0
+        self.on_commit = None
+
+    def steer_left(self):
+        self.steering = -1
+        self.version += 1
+
+    def steer_right(self):
+        self.steering = 1
+        self.version += 1
+
+    def steer_neutral(self):
+        self.steering = 0
+        self.version += 1
+
+    def forward(self, power: int = 100):
+        self.speed = max(0, min(100, power))
+        self.version += 1
+
+    def reverse(self, power: int = 100):
+        self.speed = -max(0, min(100, power))
+        self.version += 1
+
+    def neutral(self):
+        self.speed = 0
+        self.version += 1
+        self.wakeup.set()
+
+        if self.running and not self.is_alive():
+            self.halt()
+
+    def exit(self):
+        self.running = False
+        self.wakeup.set()
+
+        if self.is_alive():
+            self.join()
+
+        self.controller.exit()
+
+    def run(self):
+        last_tick = next_tick = time.monotonic()
+
+        while self.running:
+            self.wakeup.wait(max(0.0, next_tick - time.monotonic()))
+            self.wakeup.clear()
+
+            now = time.monotonic()
+            try:
+                self.tick(now, now - last_tick)
+            except Exception as exception:
+                print('Control loop tick failed:', repr(exception))
+                self.halt()
+            last_tick = now
+
+            if now >= next_tick:
+                # Ticks that were missed are skipped instead of run in a burst
+                next_tick = max(next_tick + self.interval, now)
+
+    def tick(self, now: float, elapsed: float):
+        self.ticks += 1
+        version = self.version
+
+        speed = self.limit_speed(elapsed)
+        if round(speed) != self.written_speed:
+            self.write_speed(round(speed))
+        self.applied_speed = speed
+
+        steering = self.steering
+        if steering != self.applied_steering and (not self.steering_rate or now - self.steered >= 1 / self.steering_rate):
+            # Rate limited steering passes through neutral when changing sides
+            if self.steering_rate:
+                steering = self.applied_steering + (1 if steering > self.applied_steering else -1)
+
+            self.write_steering(steering)
+            self.applied_steering = steering
+            self.steered = now
+
+        if version != self.committed:
+            self.committed = version
+            if self.on_commit is not None:
+                self.on_commit(version, time.time())
+
+    def halt(self):
+        """Puts the controller in neutral and drops the desired state, so that a failing command is not retried."""
+        self.speed = 0
+        self.steering = self.applied_steering
+
+        try:
+            self.controller.neutral()
+        except Exception as exception:
+            print('Unable to put the controller in neutral:', repr(exception))
+
+        self.applied_speed = 0.0
+        self.written_speed = 0
+
+    def limit_speed(self, elapsed: float) -> float:
+        """Speed to apply this tick, only speeding up is limited and changing direction stops first."""
+        target = self.speed
+        current = self.applied_speed
+
+        if current and (target > 0) != (current > 0):
+            return 0.0
+
+        if abs(target) <= abs(current) or not self.max_acceleration:
+            return float(target)
+
+        step = min(self.max_acceleration * elapsed, abs(target) - abs(current))
+        return current + (step if target > 0 else -step)
+
+    def write_speed(self, speed: int):
+        if speed > 0:
+            self.controller.forward(speed)
+        elif speed < 0:
+            self.controller.reverse(-speed)
+        else:
+            self.controller.neutral()
+
+        self.written_speed = speed
+        self.writes += 1
+
+    def write_steering(self, steering: int):
+        if steering < 0:
+            self.controller.steer_left()
+        elif steering > 0:
+            self.controller.steer_right()
+        else:
+            self.controller.steer_neutral()
+
+        self.writes += 1
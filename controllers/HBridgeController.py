@@ -1,53 +1,66 @@
 # noinspection PyUnresolvedReferences
 from actuators.HBridgeActuator import HBridgeActuator as Actuator
+from actuators.PinRegister import PinRegister
 import os
 from controllers.Controller import Controller
 
-# noinspection PyUnresolvedReferences
-import RPi.GPIO as GPIO
+from lib.gpio import GPIO
 
 
 class HBridgeController(Controller):
     def __init__(self):
         GPIO.setmode(GPIO.BOARD)
+
+        # Every command changes the pins of all its actuators at once
+        self.register = PinRegister()
+
         self.left = Actuator(
             pin_forward=int(os.getenv('PIN_LEFT_FORWARD')),
             pin_backward=int(os.getenv('PIN_LEFT_BACKWARD')),
-            pin_pwm=int(os.getenv('PIN_LEFT_PWM'))
+            pin_pwm=int(os.getenv('PIN_LEFT_PWM')),
+            register=self.register
         )
 
         self.right = Actuator(
             pin_forward=int(os.getenv('PIN_RIGHT_FORWARD')),
             pin_backward=int(os.getenv('PIN_RIGHT_BACKWARD')),
-            pin_pwm=int(os.getenv('PIN_RIGHT_PWM'))
+            pin_pwm=int(os.getenv('PIN_RIGHT_PWM')),
+            register=self.register
         )
 
         self.steering = Actuator(
             pin_forward=int(os.getenv('PIN_STEER_LEFT')),
             pin_backward=int(os.getenv('PIN_STEER_RIGHT')),
-            pin_pwm=int(os.getenv('PIN_STEER_PWM'))
+            pin_pwm=int(os.getenv('PIN_STEER_PWM')),
+            register=self.register
         )
 
     def steer_left(self):
-        self.steering.reverse()
+        with self.register:
+            self.steering.reverse()
 
     def steer_right(self):
-        self.steering.forward()
+        with self.register:
+            self.steering.forward()
 
     def steer_neutral(self):
-        self.steering.neutral()
+        with self.register:
+            self.steering.neutral()
 
     def forward(self, power: int = 100):
-        self.left.forward(power)
-        self.right.forward(power)
+        with self.register:
+            self.left.forward(power)
+            self.right.forward(power)
 
     def reverse(self, power: int = 100):
-        self.left.reverse(power)
-        self.right.reverse(power)
+        with self.register:
+            self.left.reverse(power)
+            self.right.reverse(power)
 
     def neutral(self):
-        self.left.neutral()
-        self.right.neutral()
+        with self.register:
+            self.left.neutral()
+            self.right.neutral()
 
     def exit(self):
         self.left.exit()
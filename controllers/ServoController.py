@@ -3,8 +3,7 @@ from actuators.ServoActuator import ServoActuator as Actuator
 import os
 from controllers.Controller import Controller
 
-# noinspection PyUnresolvedReferences
-import RPi.GPIO as GPIO
+from lib.gpio import GPIO
 
 
 class ServoController(Controller):
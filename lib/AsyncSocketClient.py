@@ -0,0 +1,268 @@
+import asyncio
+import os
+import random
+import socket
+import struct
+
+from lib.constants import *
+from lib.FrameDecoder import FrameDecoder
+
+# noinspection PyUnresolvedReferences
+from lib import settings
+
+
+class AsyncSocketClient:
+    """SocketClient for asyncio, so that a single thread can serve many connections.
+
+    The connection is established in the background and re-established whenever it is lost, until the
+    client is closed. Received messages are iterated with `async for`:
+
+        client = AsyncSocketClient(SOCKET_ID_VEHICLE, heartbeat=True)
+        await client.connect()
+
+        async for message in client:
+            await client.send_command(SOCKET_JOY_NEUTRAL)
+    """
+
+    # Protocol requested during the identity handshake, None keeps the text protocol
+    protocol = None
+    decoder_class = FrameDecoder
+
+    def __init__(self, identity: str, on_disconnect=None, heartbeat: bool = False):
+        self.host = str(os.getenv('SOCKET_HOST', '0.0.0.0'))
+        self.port = int(os.getenv('SOCKET_PORT'))
+
+        # Unix domain socket of the server, preferred when it runs on this machine
+        self.unix_path = os.getenv('SOCKET_UNIX_PATH') if self.host in SOCKET_LOCAL_HOSTS else None
+        self.on_disconnect = on_disconnect
+        self.identity = identity
+
+        # Instance number pairs e.g. a joystick with the vehicle that has the same number
+        instance = os.getenv('SOCKET_INSTANCE')
+        if instance and SOCKET_ID_SEPARATOR not in identity:
+            self.identity = identity + SOCKET_ID_SEPARATOR + instance
+
+        self.reader = None
+        self.writer = None
+        self.connected = False
+        self.closed = False
+        self.decoder = self.decoder_class()
+
+        # Heartbeats are only answered while the received messages are iterated
+        self.heartbeat = heartbeat
+        self.heartbeat_timeout = 0.0
+
+        # Created by connect, on the event loop the client runs on
+        self.messages = None
+        self.established = None
+        self.task = None
+
+    async def connect(self, timeout: float = None) -> bool:
+        """Starts connecting in the background, returns whether the connection was established within the timeout."""
+        if self.task is None:
+            self.messages = asyncio.Queue()
+            self.established = asyncio.Event()
+            self.task = asyncio.ensure_future(self.run())
+
+        try:
+            await asyncio.wait_for(self.established.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self) -> None:
+        """Closes the connection for good, which ends the iteration over received messages."""
+        self.closed = True
+
+        if self.task is not None:
+            # The reader ends as well when the cancellation arrives while it already returned
+            self.disconnect()
+            self.task.cancel()
+
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+            self.messages.put_nowait(None)
+
+    async def run(self) -> None:
+        """Keeps the connection up until the client is closed, retrying with a jittered exponential backoff."""
+        delay = SOCKET_RECONNECT_MIN
+
+        while not self.closed:
+            try:
+                await self.open()
+            except ValueError as exception:
+                # Retrying does not help against a refused identity
+                print(exception)
+                self.closed = True
+                self.messages.put_nowait(None)
+                return
+            except (OSError, EOFError, asyncio.TimeoutError) as exception:
+                print('Failed to connect to server:', exception)
+                self.disconnect()
+
+                wait = random.uniform(delay / 2, delay)
+                print('Retrying in', round(wait, 3), 'seconds')
+                await asyncio.sleep(wait)
+                delay = min(delay * 2, SOCKET_RECONNECT_MAX)
+                continue
+
+            delay = SOCKET_RECONNECT_MIN
+
+            try:
+                await self.receive()
+            finally:
+                self.disconnect()
+
+    async def open(self) -> None:
+        """Connects and identifies, over the Unix domain socket of the server if available and TCP otherwise."""
+        if self.unix_path and os.path.exists(self.unix_path):
+            print('Connecting to local host', self.unix_path)
+
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.unix_path)
+            except OSError as exception:
+                print('Failed to connect to local host:', exception)
+
+        if self.writer is None:
+            print('Connecting to remote host', self.host + ':' + str(self.port))
+            self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port),
+                                                              SOCKET_CONNECT_TIMEOUT)
+
+            # Small messages such as a pong go out right away
+            connection = self.writer.get_extra_info('socket')
+            if connection is not None:
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        options = [self.protocol, SOCKET_PROTOCOL_HEARTBEAT if self.heartbeat else None]
+        self.writer.write((' '.join(filter(None, [self.identity] + options)) + SOCKET_EOL).encode())
+
+        # Messages sent right after the approval stay in the buffer of the reader
+        approval = await asyncio.wait_for(self.reader.readuntil(SOCKET_EOL.encode()), SOCKET_CONNECT_TIMEOUT)
+        attributes = approval[:-len(SOCKET_EOL)].decode().split()
+        if attributes[:1] != [SOCKET_ID_APPROVED] or (self.protocol and self.protocol not in attributes):
+            raise ValueError('Unknown identity ' + self.identity)
+
+        self.heartbeat_timeout = 0.0
+        if SOCKET_PROTOCOL_HEARTBEAT in attributes:
+            interval = float(attributes[attributes.index(SOCKET_PROTOCOL_HEARTBEAT) + 1])
+            self.heartbeat_timeout = interval * SOCKET_HEARTBEAT_MISSES
+
+        self.decoder = self.decoder_class()
+        self.connected = True
+        self.established.set()
+        print('Connection established')
+
+    async def receive(self) -> None:
+        """Delivers received messages until the server leaves or stops sending heartbeats."""
+        while True:
+            try:
+                data = await asyncio.wait_for(self.reader.read(4096), self.heartbeat_timeout or None)
+            except asyncio.TimeoutError:
+                print('Server stopped sending heartbeats')
+                return
+            except ConnectionError:
+                data = b''
+
+            if self.closed:
+                return
+
+            if not data:
+                print('Server left the room')
+                return
+
+            for message in self.decoder.feed(data):
+                self.deliver(message)
+
+    def disconnect(self) -> None:
+        if self.established is not None:
+            self.established.clear()
+
+        if self.connected:
+            print('Closing connection')
+            self.connected = False
+
+            if self.on_disconnect:
+                self.on_disconnect()
+
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = None
+            self.writer = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.messages.get()
+
+        if message is None:
+            raise StopAsyncIteration
+
+        return message
+
+    def command(self, message) -> str:
+        """Name of the command of a received message."""
+        return message.partition(' ')[0]
+
+    def deliver(self, message) -> None:
+        """Answers heartbeats of the server, every other message is queued for the iteration."""
+        if self.command(message) == SOCKET_PING:
+            self.writer.write(self.encode(SOCKET_PONG, ()))
+            return
+
+        self.messages.put_nowait(message)
+
+    def encode(self, command: str, params: tuple) -> bytes:
+        return (' '.join([command] + [str(i) for i in list(params)]) + SOCKET_EOL).encode()
+
+    async def send(self, message: str) -> bool:
+        return await self.write((message + SOCKET_EOL).encode())
+
+    async def send_command(self, command: str, *params) -> bool:
+        """Sends a command, returns False while disconnected. Waits while the server does not keep up."""
+        try:
+            data = self.encode(command, params)
+        except (KeyError, ValueError, struct.error):
+            print('Unable to encode', command)
+            return False
+
+        return await self.write(data)
+
+    async def write(self, data: bytes) -> bool:
+        if not self.connected:
+            return False
+
+        try:
+            self.writer.write(data)
+            await self.writer.drain()
+            return True
+        except ConnectionError:
+            return False
+
+
+if __name__ == '__main__':
+    def on_disconnect() -> None:
+        print('Server disconnected')
+
+
+    async def communicate(client: AsyncSocketClient) -> None:
+        loop = asyncio.get_event_loop()
+
+        while True:
+            await client.send(await loop.run_in_executor(None, input))
+
+
+    async def main(identity: str) -> None:
+        client = AsyncSocketClient(identity, on_disconnect, heartbeat=True)
+        await client.connect()
+        asyncio.ensure_future(communicate(client))
+
+        async for message in client:
+            print('Received:', message)
+
+
+    print('Enter identity:')
+    asyncio.get_event_loop().run_until_complete(main('id_' + input()))
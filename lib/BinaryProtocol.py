@@ -0,0 +1,94 @@
+import re
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from lib.commands import COMMANDS
+from lib.constants import *
+
+# Every frame starts with the length of the remainder of the frame followed by the opcode, the
+# fixed-width parameters are declared by the binary struct format of each command
+ENCODERS = {
+    command: (struct.Struct('!BB' + COMMANDS.get(command).binary), opcode, COMMANDS.get(command).params)
+    for command, opcode in SOCKET_OPCODES.items()
+}
+
+# Commands with bounded parameters also get their parameter types, to reject values out of range
+DECODERS = {
+    opcode: (command, struct.Struct('!' + COMMANDS.get(command).binary),
+             COMMANDS.get(command).params if COMMANDS.get(command).bounded else None)
+    for command, opcode in SOCKET_OPCODES.items()
+}
+
+
+# A frame of every possible length, so that regular expressions split a stream into frames in C instead of a
+# Python loop per frame. Frames are matched from the first byte on, a run only stops at an incomplete frame.
+FRAME_PATTERN = b'|'.join(re.escape(bytes([length])) + b'.{' + str(length).encode() + b'}' for length in range(256))
+FRAME = re.compile(b'(?s)' + FRAME_PATTERN)
+FRAMES = re.compile(b'(?s)(?:' + FRAME_PATTERN + b')*')
+
+# Decoded frames, joystick commands repeat the same few frames. Cleared when full, as frames such as traces
+# carry values that never repeat.
+CACHE_SIZE = 4096
+cache: Dict[bytes, Optional[Tuple[str, tuple]]] = {}
+
+
+def encode(command: str, params=()) -> bytes:
+    """Packs a command and its parameters into a single binary frame."""
+    frame, opcode, types = ENCODERS[command]
+    return frame.pack(frame.size - 1, opcode, *[convert(param) for convert, param in zip(types, params)])
+
+
+def decode(frame: bytes) -> Optional[Tuple[str, tuple]]:
+    """Unpacks a single frame, None for frames that this side does not know or with parameters out of range."""
+    decoder = DECODERS.get(frame[1]) if len(frame) > 1 else None
+    if decoder is None or len(frame) - 2 != decoder[1].size:
+        return None
+
+    command, parameters, types = decoder
+    params = parameters.unpack_from(frame, 2)
+
+    if types is not None:
+        try:
+            params = tuple(convert(param) for convert, param in zip(types, params))
+        except ValueError:
+            return None
+
+    return command, params
+
+
+class BinaryFrameDecoder:
+    """Incrementally splits a byte stream into binary frames and unpacks them into commands."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Tuple[str, tuple]]:
+        """Adds received bytes and returns the command and parameters of all frames that are complete."""
+        if self.buffer:
+            self.buffer += data
+            data = bytes(self.buffer)
+
+        # Matches are contiguous unless a frame is incomplete, after which they are bytes of that frame
+        frames = FRAME.findall(data)
+        end = sum(map(len, frames))
+        if end != len(data):
+            end = FRAMES.match(data).end()
+            frames = FRAME.findall(data, 0, end)
+
+        self.buffer[:] = data[end:]
+
+        messages = []
+        for frame in frames:
+            # A single lookup, as other threads can clear the cache in between. False is never cached, unknown
+            # frames are cached as None and skipped thanks to the length prefix.
+            message = cache.get(frame, False)
+            if message is False:
+                if len(cache) >= CACHE_SIZE:
+                    cache.clear()
+
+                message = cache[frame] = decode(frame)
+
+            if message is not None:
+                messages.append(message)
+
+        return messages
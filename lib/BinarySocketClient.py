@@ -0,0 +1,25 @@
+from lib import BinaryProtocol
+from lib.BinaryProtocol import BinaryFrameDecoder
+from lib.constants import *
+from lib.SocketClient import SocketClient
+
+
+class BinarySocketClient(SocketClient):
+    """SocketClient that negotiates the binary protocol, callbacks receive the command and its parameters."""
+
+    protocol = SOCKET_PROTOCOL_BINARY
+    decoder_class = BinaryFrameDecoder
+
+    def dispatch(self, callback, message) -> None:
+        command, params = message
+        callback(command, params)
+
+    def send(self, message: str) -> bool:
+        attributes = message.split()
+        return self.send_command(attributes[0], *attributes[1:])
+
+    def command(self, message) -> str:
+        return message[0]
+
+    def encode(self, command: str, params: tuple) -> bytes:
+        return BinaryProtocol.encode(command, params)
@@ -0,0 +1,28 @@
+class CommandBatch:
+    """Collects commands of a SocketClient that are sent together, with a single write, when the batch is left.
+
+        with client.batch() as batch:
+            batch.send_command(SOCKET_JOY_DIR_LEFT)
+            batch.send_command(SOCKET_JOY_FORWARD, 50)
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __enter__(self) -> 'CommandBatch':
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        # A batch that failed halfway is dropped instead of sending half a control update
+        if exception_type is None:
+            self.flush()
+
+    def send_command(self, command: str, *params) -> bool:
+        self.commands.append((command, params))
+        return True
+
+    def flush(self) -> bool:
+        """Sends the collected commands, returns False when they could not be sent."""
+        commands, self.commands = self.commands, []
+        return not commands or self.client.send_batch(commands)
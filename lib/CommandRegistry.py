@@ -0,0 +1,149 @@
+from typing import Callable, Dict, Iterable
+
+
+class Bounded:
+    """Parameter type that converts like its type and rejects values outside of low to high with a ValueError."""
+
+    def __init__(self, convert: Callable, low, high):
+        self.convert = convert
+        self.low = low
+        self.high = high
+
+    def __call__(self, value):
+        value = self.convert(value)
+
+        if not self.low <= value <= self.high:
+            raise ValueError(str(value) + ' is not within ' + str(self.low) + ' and ' + str(self.high))
+
+        return value
+
+
+class Command:
+    """Declaration of a command: its parameters, who may send it and where the relay routes it."""
+
+    def __init__(self, name: str, params: tuple = (), defaults: tuple = (), binary: str = '',
+                 senders: Iterable[str] = (), target: str = None):
+        self.name = name
+        self.params = params
+        self.defaults = defaults
+        self.binary = binary
+        self.senders = frozenset(senders)
+        self.target = target
+        self.bounded = any(isinstance(param, Bounded) for param in params)
+        self.parse = self.compile_parser()
+
+    def compile_parser(self) -> Callable[[str], tuple]:
+        """Builds a parser that converts the text following the command into typed parameters.
+
+        Missing parameters are taken from the defaults, surplus parameters are ignored and
+        parameters that cannot be converted raise a ValueError.
+        """
+        params = self.params
+        defaults = self.defaults
+
+        if not params:
+            return lambda text: ()
+
+        if len(params) == 1:
+            convert = params[0]
+            default = defaults[:1]
+
+            def parse_single(text: str) -> tuple:
+                if not text:
+                    return default
+
+                # Converting the whole text first skips splitting in the common case of a single value
+                try:
+                    return convert(text),
+                except ValueError:
+                    attributes = text.split()
+                    return (convert(attributes[0]),) if attributes else default
+
+            return parse_single
+
+        def parse(text: str) -> tuple:
+            attributes = text.split()
+            values = tuple(convert(value) for convert, value in zip(params, attributes))
+            return values + defaults[len(values):]
+
+        return parse
+
+
+class CommandRegistry:
+    """Holds every command of the protocol, dispatch tables are derived from it once."""
+
+    def __init__(self):
+        self.commands: Dict[str, Command] = {}
+        self.tables: Dict[str, Dict[str, Command]] = {}
+
+    def register(self, name: str, **declaration) -> Command:
+        command = Command(name, **declaration)
+        self.commands[name] = command
+        self.tables.clear()
+        return command
+
+    def get(self, name: str) -> Command:
+        return self.commands.get(name)
+
+    def table(self, sender: str) -> Dict[str, Command]:
+        """Commands the sender is allowed to send, by name."""
+        if sender not in self.tables:
+            self.tables[sender] = {
+                name: command for name, command in self.commands.items() if sender in command.senders
+            }
+
+        return self.tables[sender]
+
+    def dispatcher(self, handlers: Dict[str, Callable], fallback: Callable = None) -> 'Dispatcher':
+        return Dispatcher(self, handlers, fallback)
+
+
+class Dispatcher:
+    """Calls the handler of a received command with its typed parameters.
+
+    Call it with a text message, or use command() for a command that was decoded from a binary
+    frame already. Commands without a handler, or with invalid parameters, go to the fallback.
+    """
+
+    def __init__(self, registry: CommandRegistry, handlers: Dict[str, Callable], fallback: Callable = None):
+        self.handlers = dict(handlers)
+        self.table = {name: self.bind(registry.commands[name], handler) for name, handler in handlers.items()}
+        self.fallback = fallback
+
+    def bind(self, command: Command, handler: Callable) -> Callable[[str], object]:
+        """Combines the parser of the command with its handler into a single call."""
+        if not command.params:
+            return lambda text: handler()
+
+        parse = command.parse
+
+        def invoke(text: str):
+            try:
+                params = parse(text)
+            except ValueError:
+                return self.unknown(command.name, text.split())
+
+            return handler(*params)
+
+        return invoke
+
+    def __call__(self, message: str):
+        name, separator, text = message.partition(' ')
+        invoke = self.table.get(name)
+
+        if invoke is not None:
+            return invoke(text)
+
+        return self.unknown(name, text.split())
+
+    def command(self, name: str, params: tuple):
+        handler = self.handlers.get(name)
+
+        if handler is not None:
+            return handler(*params)
+
+        return self.unknown(name, params)
+
+    def unknown(self, name: str, params):
+        if self.fallback:
+            return self.fallback(name, params)
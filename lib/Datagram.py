@@ -0,0 +1,37 @@
+import struct
+from typing import Dict
+
+from lib.constants import *
+
+# Every datagram starts with the token of the connection it belongs to and a sequence number, followed by the
+# frames of a single update in the protocol of that connection
+HEADER = struct.Struct('!IQ')
+
+
+def pack(token: int, sequence: int, data: bytes) -> bytes:
+    return HEADER.pack(token, sequence) + data
+
+
+def decode(decoder, payload: bytes) -> list:
+    """Decodes the frames of a datagram, a datagram never continues in the next one."""
+    messages = decoder.feed(payload)
+    decoder.buffer.clear()
+    return messages
+
+
+class SequenceFilter:
+    """Drops datagrams that are older than the last accepted datagram of the same control channel.
+
+    Speed and steering are separate channels, so a late steering update does not suppress a newer speed.
+    """
+
+    def __init__(self):
+        self.last: Dict[str, int] = {}
+
+    def accept(self, command: str, sequence: int) -> bool:
+        channel = SOCKET_CONFLATE_CHANNELS.get(command, command)
+        if sequence <= self.last.get(channel, 0):
+            return False
+
+        self.last[channel] = sequence
+        return True
@@ -0,0 +1,57 @@
+import time
+from threading import Thread, Condition
+from typing import Callable, Dict, Hashable, Tuple
+
+
+class DeadlineScheduler(Thread):
+    """Calls the callback of a deadline once it passed, re-arming a deadline with the same key replaces it.
+
+    The thread sleeps until the earliest deadline on the monotonic clock and is only woken up when a deadline
+    moves earlier, so re-arming a deadline on every received message does not wake it up at all. Callbacks run
+    on the thread of the scheduler.
+    """
+
+    def __init__(self, name: str = 'DeadlineScheduler'):
+        Thread.__init__(self, name=name)
+        self.daemon = True
+
+        self.deadlines: Dict[Hashable, Tuple[float, Callable[[], None]]] = {}
+        self.condition = Condition()
+
+        # Deadline the thread currently sleeps until
+        self.waiting_until = float('inf')
+
+    def arm(self, key: Hashable, delay: float, callback: Callable[[], None]):
+        """Calls the callback once the delay in seconds passed, unless the key is re-armed or cancelled before."""
+        deadline = time.monotonic() + delay
+
+        with self.condition:
+            self.deadlines[key] = (deadline, callback)
+
+            if deadline < self.waiting_until:
+                self.condition.notify()
+
+    def cancel(self, key: Hashable):
+        # The thread may still wake up for the cancelled deadline, it then finds nothing to do
+        with self.condition:
+            self.deadlines.pop(key, None)
+
+    def run(self):
+        while True:
+            with self.condition:
+                now = time.monotonic()
+                due = [key for key, (deadline, callback) in self.deadlines.items() if deadline <= now]
+                callbacks = [self.deadlines.pop(key)[1] for key in due]
+
+                if not callbacks:
+                    self.waiting_until = min([deadline for deadline, callback in self.deadlines.values()],
+                                             default=float('inf'))
+                    self.condition.wait(self.waiting_until - now if self.deadlines else None)
+                    self.waiting_until = float('-inf')
+                    continue
+
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as exception:
+                    print('Deadline failed:', exception)
@@ -0,0 +1,56 @@
+from typing import List
+
+from lib.constants import *
+
+
+class FrameDecoder:
+    """Incrementally splits a byte stream into messages delimited by SOCKET_EOL.
+
+    Bytes following the last delimiter are kept until the next read completes the message, and
+    only complete messages are decoded. Messages that exceed max_size or are not UTF-8 raise a FrameError.
+    """
+
+    delimiter = SOCKET_EOL.encode()
+
+    def __init__(self, max_size: int = 65536):
+        self.buffer = bytearray()
+        self.max_size = max_size
+
+    def feed(self, data: bytes) -> List[str]:
+        """Adds received bytes and returns all messages that are complete."""
+        buffer = self.buffer
+        delimiter = self.delimiter
+
+        # Common case of a read that holds complete messages only, no buffering needed
+        if not buffer and data.endswith(delimiter):
+            try:
+                return [message.decode() for message in data.split(delimiter) if message]
+            except UnicodeDecodeError as exception:
+                raise FrameError('Message is not UTF-8: ' + str(exception))
+
+        # A delimiter can only start in the tail of the previous read or in the new data
+        start = max(0, len(buffer) - len(delimiter) + 1)
+        buffer += data
+
+        # Everything up to the last delimiter consists of complete messages
+        end = buffer.rfind(delimiter, start)
+        complete = b''
+        if end >= 0:
+            with memoryview(buffer) as view:
+                complete = view[:end].tobytes()
+
+            del buffer[:end + len(delimiter)]
+
+        # Only the incomplete message after the last delimiter is kept, which may not grow without bounds
+        if len(buffer) > self.max_size:
+            buffer.clear()
+            raise FrameError('Message exceeds ' + str(self.max_size) + ' bytes')
+
+        try:
+            return [message.decode() for message in complete.split(delimiter) if message]
+        except UnicodeDecodeError as exception:
+            raise FrameError('Message is not UTF-8: ' + str(exception))
+
+
+class FrameError(ValueError):
+    pass
@@ -0,0 +1,204 @@
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Thread, Lock
+from typing import Dict
+
+# Upper bounds of the latency buckets in seconds
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Identities of which metrics are kept, the ones that disconnected longest ago are forgotten beyond it
+METRICS_IDENTITIES = 1000
+
+
+def escape(value: str) -> str:
+    """Escapes a label value, identities are supplied by clients."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, observing is a bisect and two additions."""
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket that holds the given quantile, inf when it is beyond the last bucket."""
+        rank = q * self.count()
+        cumulative = 0
+
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if count and cumulative >= rank:
+                return bound
+
+        return float('inf')
+
+    def render(self, name: str, labels: str) -> list:
+        lines = []
+        cumulative = 0
+
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(name + '_bucket{' + labels + ',le="' + str(bound) + '"} ' + str(cumulative))
+
+        lines.append(name + '_sum{' + labels + '} ' + repr(self.sum))
+        lines.append(name + '_count{' + labels + '} ' + str(cumulative))
+        return lines
+
+
+class IdentityMetrics:
+    """Counters of all connections that used one identity.
+
+    Counters are plain attributes that are updated without locking; an update racing with another
+    connection of the same identity can rarely get lost, which is acceptable for monitoring.
+    """
+
+    def __init__(self):
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.unknown = 0
+        self.connections = 0
+
+        # Connections that are open, a connection made while none was open is a reconnect
+        self.connected = 0
+        self.reconnects = 0
+        self.disconnected = 0.0
+
+        # Queue counters of connections that closed already
+        self.dropped = 0
+        self.conflated = 0
+
+        self.queue_wait = Histogram()
+        self.routes: Dict[str, Histogram] = {}
+
+    def route(self, target: str) -> Histogram:
+        """Histogram of the time from receiving a message to queueing it for every recipient."""
+        histogram = self.routes.get(target)
+        if histogram is None:
+            histogram = self.routes[target] = Histogram()
+
+        return histogram
+
+
+class Metrics:
+    """Metrics of a SocketServer, served in the Prometheus text format."""
+
+    def __init__(self, server):
+        self.server = server
+        self.identities: Dict[str, IdentityMetrics] = {}
+        self.lock = Lock()
+
+    def connect(self, identity: str) -> IdentityMetrics:
+        """Counts a new connection of the identity and returns the metrics it updates."""
+        with self.lock:
+            metrics = self.identities.get(identity)
+            if metrics is None:
+                if len(self.identities) >= METRICS_IDENTITIES:
+                    self.prune()
+
+                metrics = self.identities[identity] = IdentityMetrics()
+            elif not metrics.connected:
+                metrics.reconnects += 1
+
+            metrics.connections += 1
+            metrics.connected += 1
+            return metrics
+
+    def disconnect(self, metrics: IdentityMetrics):
+        # Connections that were never identified only have metrics of their own
+        with self.lock:
+            if metrics.connected:
+                metrics.connected -= 1
+                metrics.disconnected = time.monotonic()
+
+    def prune(self):
+        """Forgets the identities without connections that disconnected longest ago, down to 3/4 of the maximum."""
+        idle = sorted((metrics.disconnected, identity) for identity, metrics in self.identities.items()
+                      if not metrics.connected)
+
+        for disconnected, identity in idle[:len(self.identities) - METRICS_IDENTITIES * 3 // 4]:
+            del self.identities[identity]
+
+    def serve(self, port: int):
+        """Serves the metrics on http://127.0.0.1:port/metrics from a background thread."""
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        http = HTTPServer(('127.0.0.1', port), MetricsHandler)
+        Thread(target=http.serve_forever, daemon=True).start()
+        print('Metrics are available on http://127.0.0.1:' + str(port) + '/metrics')
+
+    def render(self) -> str:
+        clients = self.server.clients()
+        with self.lock:
+            identities = sorted((escape(identity), metrics) for identity, metrics in self.identities.items())
+
+        queues = {}
+        for client in clients:
+            depth, dropped, conflated, connected = queues.get(escape(client.identity), (0, 0, 0, 0))
+            queues[escape(client.identity)] = (depth + client.queue.depth(), dropped + client.queue.dropped,
+                                       conflated + client.queue.conflated, connected + 1)
+
+        lines = []
+        counters = [
+            ('relay_messages_received_total', 'counter', lambda metrics: metrics.messages_in),
+            ('relay_messages_sent_total', 'counter', lambda metrics: metrics.messages_out),
+            ('relay_bytes_received_total', 'counter', lambda metrics: metrics.bytes_in),
+            ('relay_bytes_sent_total', 'counter', lambda metrics: metrics.bytes_out),
+            ('relay_unknown_commands_total', 'counter', lambda metrics: metrics.unknown),
+            ('relay_connections_total', 'counter', lambda metrics: metrics.connections),
+            ('relay_reconnects_total', 'counter', lambda metrics: metrics.reconnects),
+        ]
+
+        for name, kind, value in counters:
+            lines.append('# TYPE ' + name + ' ' + kind)
+            for identity, metrics in identities:
+                lines.append(name + '{identity="' + identity + '"} ' + str(value(metrics)))
+
+        gauges = [
+            ('relay_connected_clients', 'gauge', lambda queue, metrics: queue[3]),
+            ('relay_queue_depth', 'gauge', lambda queue, metrics: queue[0]),
+            ('relay_queue_dropped_total', 'counter', lambda queue, metrics: metrics.dropped + queue[1]),
+            ('relay_queue_conflated_total', 'counter', lambda queue, metrics: metrics.conflated + queue[2]),
+        ]
+
+        for name, kind, value in gauges:
+            lines.append('# TYPE ' + name + ' ' + kind)
+            for identity, metrics in identities:
+                queue = queues.get(identity, (0, 0, 0, 0))
+                lines.append(name + '{identity="' + identity + '"} ' + str(value(queue, metrics)))
+
+        lines.append('# TYPE relay_queue_wait_seconds histogram')
+        for identity, metrics in identities:
+            lines.extend(metrics.queue_wait.render('relay_queue_wait_seconds', 'identity="' + identity + '"'))
+
+        lines.append('# TYPE relay_route_seconds histogram')
+        for identity, metrics in identities:
+            for target, histogram in sorted(list(metrics.routes.items())):
+                labels = 'source="' + identity + '",target="' + escape(target) + '"'
+                lines.extend(histogram.render('relay_route_seconds', labels))
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,113 @@
+from collections import deque
+from threading import Condition
+from time import perf_counter
+
+from lib.constants import *
+
+
+class OutboundQueue:
+    """Bounded queue of encoded messages waiting to be written to a single client.
+
+    Messages of a conflated channel are queued as a [data, channel] slot, a newer message on the same
+    channel replaces the data of the pending slot instead of taking another place in the queue.
+    """
+
+    def __init__(self, size: int = 256, policy: str = SOCKET_QUEUE_DROP_OLDEST):
+        self.frames = deque()
+        self.latest = {}
+        self.size = size
+        self.policy = policy
+        self.condition = Condition()
+        self.closed = False
+
+        # Counters
+        self.dropped = 0
+        self.conflated = 0
+        self.high_water = 0
+
+        # Time the oldest queued message was queued at and how long the last taken messages waited
+        self.since = 0.0
+        self.waited = 0.0
+
+    def put(self, data: bytes, channel: str = None, notify: bool = True) -> bool:
+        """Queues a message, returns False when the overflow policy requires disconnecting the client.
+
+        Without notify the waiting reader keeps sleeping until notify() is called, so that several messages are
+        taken together.
+        """
+        with self.condition:
+            if self.closed:
+                return False
+
+            if channel is not None:
+                slot = self.latest.get(channel)
+
+                if slot is not None:
+                    slot[0] = data
+                    self.conflated += 1
+                    return True
+
+            if len(self.frames) >= self.size:
+                if self.policy == SOCKET_QUEUE_DISCONNECT:
+                    self.closed = True
+                    self.condition.notify()
+                    return False
+
+                self.dropped += 1
+
+                if self.policy == SOCKET_QUEUE_DROP_NEWEST:
+                    return True
+
+                oldest = self.frames.popleft()
+                if type(oldest) is list:
+                    del self.latest[oldest[1]]
+
+            if channel is not None:
+                data = self.latest[channel] = [data, channel]
+
+            if not self.frames:
+                self.since = perf_counter()
+
+            self.frames.append(data)
+            self.high_water = max(self.high_water, len(self.frames))
+
+            if notify:
+                self.condition.notify()
+
+        return True
+
+    def get(self, timeout: float = None):
+        """Blocks until messages are queued and takes all of them, returns None once closed."""
+        with self.condition:
+            while not self.frames and not self.closed:
+                if not self.condition.wait(timeout):
+                    return []
+
+            if self.closed:
+                return None
+
+            return self.take()
+
+    def take(self) -> list:
+        """Takes all queued messages without blocking."""
+        with self.condition:
+            frames = [frame if type(frame) is not list else frame[0] for frame in self.frames]
+            self.frames.clear()
+            self.latest.clear()
+
+            if frames:
+                self.waited = perf_counter() - self.since
+
+            return frames
+
+    def notify(self):
+        with self.condition:
+            self.condition.notify()
+
+    def depth(self) -> int:
+        return len(self.frames)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
@@ -0,0 +1,84 @@
+import mmap
+import struct
+import time
+from threading import Lock
+from typing import Iterator, Tuple
+
+# Files start with the magic, followed by records of a header, the source identity, the route and the message
+MAGIC = b'SDREC2\n'
+RECORD = struct.Struct('!dHHH')
+
+
+class Recorder:
+    """Appends every relayed message with its time, source identity and route to a binary file.
+
+    Records are buffered, the server calls flush every flush_interval so that recent traffic reaches the disk even if
+    the server gets killed.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1):
+        self.file = open(path, 'ab', buffering=65536)
+        self.lock = Lock()
+        self.flush_interval = flush_interval
+
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+
+    def record(self, source: str, route: str, command: str, params: tuple):
+        now = time.time()
+        source = source.encode()
+        route = route.encode()
+        message = ' '.join([command] + [str(param) for param in params]).encode()
+
+        with self.lock:
+            # Connections can still relay while the server stops
+            if self.file.closed:
+                return
+
+            self.file.write(RECORD.pack(now, len(source), len(route), len(message)) + source + route + message)
+
+    def flush(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class Recording:
+    """Reads a recorded file through a memory map, records are decoded on iteration without loading the file."""
+
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(path + ' is not a recording')
+
+    def __iter__(self) -> Iterator[Tuple[float, str, str, str]]:
+        """Yields the time, source identity, route and message of every complete record."""
+        data = self.map
+        size = len(data)
+        position = len(MAGIC)
+
+        while position + RECORD.size <= size:
+            timestamp, source_size, route_size, message_size = RECORD.unpack_from(data, position)
+            start = position + RECORD.size
+            end = start + source_size + route_size + message_size
+
+            # The last record can be incomplete when the server was stopped while writing it
+            if end > size:
+                return
+
+            source = data[start:start + source_size].decode()
+            route = data[start + source_size:start + source_size + route_size].decode()
+            message = data[start + source_size + route_size:end].decode()
+            yield timestamp, source, route, message
+
+            position = end
+
+    def close(self):
+        self.map.close()
+        self.file.close()
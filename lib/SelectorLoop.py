@@ -0,0 +1,103 @@
+import selectors
+import socket
+from collections import deque
+from threading import Thread, get_ident
+
+import SocketServer
+from lib.SelectorSocketServerClient import SelectorSocketServerClient
+
+
+class SelectorLoop(Thread):
+    """Event loop that serves many non-blocking connections from a single thread."""
+
+    def __init__(self, server: SocketServer, name: str):
+        Thread.__init__(self, name=name)
+        self.daemon = True
+
+        self.server: SocketServer = server
+        self.selector = selectors.DefaultSelector()
+        self.pending = deque()
+        self.dirty = set()
+        self.owner = None
+
+        # Other threads hand over work through a socket pair that wakes up the selector
+        self.waker, self.wakee = socket.socketpair()
+        self.waker.setblocking(False)
+        self.wakee.setblocking(False)
+        self.selector.register(self.wakee, selectors.EVENT_READ, self.on_wakeup)
+
+    def run(self):
+        self.owner = get_ident()
+
+        while True:
+            for key, mask in self.selector.select():
+                self.call(key.data, mask)
+
+            while self.pending:
+                callback, args = self.pending.popleft()
+                self.call(callback, *args)
+
+            # Everything queued for a client during this iteration goes out in a single send
+            while self.dirty:
+                self.call(self.dirty.pop().flush)
+
+    def call(self, callback, *args):
+        """Runs a callback of the loop, a failing connection is closed instead of stopping the loop and with it
+        every other connection."""
+        try:
+            callback(*args)
+        except Exception as exception:
+            print('Event loop callback failed:', repr(exception))
+
+            client = getattr(callback, '__self__', None)
+            if isinstance(client, SelectorSocketServerClient):
+                client.close()
+
+    def call_soon(self, callback, *args):
+        """Schedules a callback on the loop thread, safe to call from any thread."""
+        self.pending.append((callback, args))
+
+        try:
+            self.waker.send(b'\0')
+        except (BlockingIOError, InterruptedError):
+            # A full wake-up buffer means the loop is woken up already
+            pass
+
+    def on_wakeup(self, mask: int):
+        try:
+            while self.wakee.recv(1024):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def add_listener(self, listener: socket, on_accept):
+        listener.setblocking(False)
+        self.selector.register(listener, selectors.EVENT_READ, on_accept)
+
+    def add_connection(self, conn: socket):
+        """Hands over an accepted connection to this loop, safe to call from any thread."""
+        self.call_soon(self.register, conn)
+
+    def register(self, conn: socket):
+        conn.setblocking(False)
+        client = SelectorSocketServerClient(self.server, conn, self)
+        self.selector.register(conn, selectors.EVENT_READ, client.on_event)
+
+    def update_interest(self, client: SelectorSocketServerClient):
+        """Only watch for writability while output is waiting, as sockets are nearly always writable."""
+        if client.closed:
+            return
+
+        events = selectors.EVENT_READ
+        if client.pending_output():
+            events |= selectors.EVENT_WRITE
+
+        if events != client.events:
+            client.events = events
+            self.selector.modify(client.conn, events, client.on_event)
+
+    def remove(self, client: SelectorSocketServerClient):
+        try:
+            self.selector.unregister(client.conn)
+        except (KeyError, ValueError):
+            pass
@@ -0,0 +1,125 @@
+import selectors
+import socket
+from threading import Lock, get_ident
+
+import SocketServer
+from lib.constants import *
+from lib.FrameDecoder import FrameError
+from lib.SocketServerClient import SocketServerClient, Disconnect
+
+
+class SelectorSocketServerClient(SocketServerClient):
+    """Non-blocking connection that is driven by a SelectorLoop instead of a thread of its own."""
+
+    def __init__(self, server: SocketServer, conn: socket, loop):
+        super().__init__(server, conn)
+        self.loop = loop
+        self.output = bytearray()
+        self.lock = Lock()
+        self.flush_scheduled = False
+        self.closed = False
+        self.events = selectors.EVENT_READ
+
+    def on_event(self, mask: int):
+        if mask & selectors.EVENT_READ:
+            self.on_readable()
+
+        if mask & selectors.EVENT_WRITE and not self.closed:
+            self.flush()
+
+    def on_readable(self):
+        try:
+            data = self.conn.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except ConnectionError:
+            data = b''
+
+        # On disconnect
+        if not data:
+            self.close()
+            return
+
+        try:
+            messages = self.decoder.feed(data)
+        except FrameError as exception:
+            print('Dropping connection with identity', self.identity, exception)
+            self.close()
+            return
+
+        self.on_received(data, messages)
+
+        # First message of every connection is its identity
+        if messages and self.client is None:
+            try:
+                self.client = self.identify(messages.pop(0))
+            except Exception as exception:
+                print(exception)
+                self.close()
+                return
+
+            messages = self.approve(messages)
+            print('Connected', self.identity)
+
+        try:
+            for message in messages:
+                self.on_message(message)
+        except Disconnect:
+            self.close()
+
+    def on_queued(self):
+        """Flushes at the end of the current loop iteration, other threads schedule a single flush."""
+        if get_ident() == self.loop.owner:
+            self.loop.dirty.add(self)
+            return
+
+        with self.lock:
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+
+        self.loop.call_soon(self.flush)
+
+    def flush(self):
+        """Writes as much as the socket accepts, the remainder waits until it becomes writable."""
+        with self.lock:
+            self.flush_scheduled = False
+
+        if self.closed:
+            return
+
+        # Bytes of a partially sent write go out before anything that was queued after it
+        if not self.output:
+            frames = self.queue.take()
+            if frames:
+                data = b''.join(frames)
+                self.output += data
+                self.on_written(data, frames)
+
+        if self.output:
+            try:
+                sent = self.conn.send(self.output)
+                del self.output[:sent]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self.close()
+                return
+
+        self.loop.update_interest(self)
+
+    def pending_output(self) -> bool:
+        return len(self.output) > 0 or self.queue.depth() > 0
+
+    def close(self):
+        """Unregisters and closes the connection, must run on the loop thread."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+
+        self.server.unregister(self)
+        self.queue.close()
+        self.loop.remove(self)
+        self.conn.close()
+        print('Disconnected', self.identity)
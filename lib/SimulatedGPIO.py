@@ -0,0 +1,166 @@
+import time
+from collections import deque, namedtuple
+from typing import Deque, Dict
+
+from lib.constants import *
+
+# A change of a pin, kind is output (value is the level), duty_cycle or frequency
+PinEvent = namedtuple('PinEvent', ['time', 'pin', 'kind', 'value'])
+
+
+class SimulatedPWM:
+    """PWM of a SimulatedGPIO, with the interface of RPi.GPIO.PWM."""
+
+    def __init__(self, gpio: 'SimulatedGPIO', pin: int, frequency: float):
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.running = False
+
+    def start(self, duty_cycle: float):
+        self.running = True
+        self.gpio.change(self.pin, 'frequency', self.frequency, self.gpio.pwm_latency)
+        self.ChangeDutyCycle(duty_cycle)
+
+    # noinspection PyPep8Naming
+    def ChangeDutyCycle(self, duty_cycle: float):
+        if not 0 <= duty_cycle <= 100:
+            raise ValueError('dutycycle must have a value from 0.0 to 100.0')
+
+        self.gpio.change(self.pin, 'duty_cycle', duty_cycle, self.gpio.pwm_latency)
+
+    # noinspection PyPep8Naming
+    def ChangeFrequency(self, frequency: float):
+        self.frequency = frequency
+        self.gpio.change(self.pin, 'frequency', frequency, self.gpio.pwm_latency)
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            self.gpio.change(self.pin, 'duty_cycle', 0, self.gpio.pwm_latency)
+
+
+class SimulatedGPIO:
+    """Stands in for the RPi.GPIO module and records every change of a pin in a timeline.
+
+    The timeline keeps the most recent timeline_size changes, so that a long running vehicle does not grow it without
+    bounds, changes counts all of them.
+
+    Every call takes at least the latency of its kind, which models the cost of a GPIO call on the Raspberry
+    Pi. The latency is spent busy waiting, sleeping is far too coarse for the microseconds a call takes. Like
+    RPi.GPIO, writing to a pin that was not set up as an output raises a RuntimeError.
+    """
+
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self, output_latency: float = 0.0, pwm_latency: float = 0.0,
+                 timeline_size: int = GPIO_TIMELINE_SIZE):
+        self.output_latency = output_latency
+        self.pwm_latency = pwm_latency
+
+        self.mode = None
+        self.directions: Dict[int, int] = {}
+        self.levels: Dict[int, int] = {}
+        self.duty_cycles: Dict[int, float] = {}
+        self.timeline: Deque[PinEvent] = deque(maxlen=timeline_size)
+        self.changes = 0
+        self.calls = 0
+
+    def reset(self):
+        """Clears the timeline and the counters, the state of the pins is kept."""
+        self.timeline.clear()
+        self.changes = 0
+        self.calls = 0
+
+    def setmode(self, mode: int):
+        self.mode = mode
+
+    def getmode(self):
+        return self.mode
+
+    def setwarnings(self, enabled: bool):
+        pass
+
+    def setup(self, channel, direction: int, initial: int = -1):
+        self.check_mode()
+
+        for pin in self.channels(channel):
+            self.directions[pin] = direction
+
+            if direction == self.OUT and initial != -1:
+                self.change(pin, 'output', initial, self.output_latency)
+
+    def output(self, channel, value):
+        """Sets one or several pins with a single call, like RPi.GPIO both accept a list or tuple."""
+        pins = self.channels(channel)
+        values = list(value) if isinstance(value, (list, tuple)) else [value] * len(pins)
+
+        if len(values) != len(pins):
+            raise RuntimeError('Number of channels != number of values')
+
+        for pin in pins:
+            if self.directions.get(pin) != self.OUT:
+                raise RuntimeError('The GPIO channel has not been set up as an OUTPUT')
+
+        self.wait(self.output_latency)
+        now = time.perf_counter()
+
+        for pin, level in zip(pins, values):
+            self.record(now, pin, 'output', int(bool(level)))
+
+    def input(self, pin: int) -> int:
+        if pin not in self.directions:
+            raise RuntimeError('You must setup() the GPIO channel first')
+
+        return self.levels.get(pin, self.LOW)
+
+    def PWM(self, pin: int, frequency: float) -> SimulatedPWM:
+        if self.directions.get(pin) != self.OUT:
+            raise RuntimeError('You must setup() the GPIO channel as an output first')
+
+        return SimulatedPWM(self, pin, frequency)
+
+    def cleanup(self, channel=None):
+        pins = list(self.directions) if channel is None else self.channels(channel)
+
+        for pin in pins:
+            self.directions.pop(pin, None)
+            self.levels.pop(pin, None)
+            self.duty_cycles.pop(pin, None)
+
+        if channel is None:
+            self.mode = None
+
+    def change(self, pin: int, kind: str, value, latency: float):
+        """Records a change of a pin, after the latency of the call passed."""
+        self.wait(latency)
+        self.record(time.perf_counter(), pin, kind, value)
+
+    def record(self, now: float, pin: int, kind: str, value):
+        if kind == 'output':
+            self.levels[pin] = value
+        elif kind == 'duty_cycle':
+            self.duty_cycles[pin] = value
+
+        self.timeline.append(PinEvent(now, pin, kind, value))
+        self.changes += 1
+
+    def wait(self, latency: float):
+        self.calls += 1
+
+        if latency:
+            until = time.perf_counter() + latency
+            while time.perf_counter() < until:
+                pass
+
+    def check_mode(self):
+        if self.mode is None:
+            raise RuntimeError('Please set pin numbering mode using GPIO.setmode(GPIO.BOARD) or GPIO.setmode(GPIO.BCM)')
+
+    def channels(self, channel) -> list:
+        return list(channel) if isinstance(channel, (list, tuple)) else [channel]
@@ -1,7 +1,14 @@
-from threading import Thread
+from itertools import count
+from threading import Thread, Lock
+from lib import Datagram
+from lib.CommandBatch import CommandBatch
 from lib.constants import *
+from lib.FrameDecoder import FrameDecoder
+from lib.OutboundQueue import OutboundQueue
 import os
+import random
 import socket
+import struct
 import time
 import select
 
@@ -10,107 +17,391 @@ from lib import settings
 
 
 class SocketClient:
-    def __init__(self, identity: str, on_disconnect=None):
+    # Protocol requested during the identity handshake, None keeps the text protocol
+    protocol = None
+    decoder_class = FrameDecoder
+
+    def __init__(self, identity: str, on_disconnect=None, heartbeat: bool = False):
         self.host = str(os.getenv('SOCKET_HOST', '0.0.0.0'))
         self.port = int(os.getenv('SOCKET_PORT'))
+
+        # Unix domain socket of the server, preferred when it runs on this machine
+        self.unix_path = os.getenv('SOCKET_UNIX_PATH') if self.host in SOCKET_LOCAL_HOSTS else None
         self.connection = None
         self.on_disconnect = on_disconnect
         self.identity = identity
+
+        # Instance number pairs e.g. a joystick with the vehicle that has the same number
+        instance = os.getenv('SOCKET_INSTANCE')
+        if instance and SOCKET_ID_SEPARATOR not in identity:
+            self.identity = identity + SOCKET_ID_SEPARATOR + instance
         self.connected = False
+        self.decoder = self.decoder_class()
+        self.pending = []
+
+        # Optional UDP channel for joystick commands, opened when the server approves it
+        self.udp = os.getenv('SOCKET_UDP', '0') == '1'
+        self.datagram = None
+        self.token = 0
+        self.sequence = count(1)
+        self.sequences = Datagram.SequenceFilter()
+        self.datagram_decoder = self.decoder_class()
+        self.announced = 0
+
+        # Servers that ping this client every interval let it notice a lost connection within a few intervals. Only
+        # clients that run listen answer the pings, the server disconnects any other client that asks for them
+        self.heartbeat = heartbeat
+        self.heartbeat_timeout = 0.0
+        self.last_received = time.monotonic()
+
+        # Commands sent while disconnected, the lock keeps them in order with commands sent after reconnecting
+        self.outbox = OutboundQueue(SOCKET_OUTBOX_SIZE)
+        self.lock = Lock()
 
     def connect(self, times_retrying: int = 20) -> bool:
-        print('Connecting to remote host', self.host + ':' + str(self.port))
+        """Connects and identifies, retrying with a jittered exponential backoff.
 
-        try:
-            self.connection = socket.socket()
-            self.connection.connect((self.host, self.port))
-            self.send_command(self.identity)
+        The backoff starts at SOCKET_RECONNECT_MIN so that a restarted server is found again right away, and grows
+        to SOCKET_RECONNECT_MAX during longer outages. Returns False once all attempts failed.
+        """
+        delay = SOCKET_RECONNECT_MIN
 
-            if not self.receive() == SOCKET_ID_APPROVED:
-                print('raised exception')
-                raise Exception('Unknown identity ' + self.identity)
+        while True:
+            try:
+                self.establish()
+                print('Connection established')
+                return True
+            except socket.error as exception:
+                print('Failed to connect to server:', exception)
+                self.close_connection()
+
+            if times_retrying <= 0:
+                return False
+
+            # Jitter keeps clients that lost the same server from reconnecting in lockstep
+            wait = random.uniform(delay / 2, delay)
+            times_retrying -= 1
+            print('Retrying in', round(wait, 3), 'seconds (' + str(times_retrying) + ' attempts left)')
+            time.sleep(wait)
+            delay = min(delay * 2, SOCKET_RECONNECT_MAX)
+
+    def establish(self) -> None:
+        """Connects and completes the identity handshake, then sends what was held in the outbox."""
+        self.connection = self.open_connection()
+        options = [self.protocol, SOCKET_PROTOCOL_DATAGRAM if self.udp else None,
+                   SOCKET_PROTOCOL_HEARTBEAT if self.heartbeat else None]
+        self.connection.sendall((' '.join(filter(None, [self.identity] + options)) + SOCKET_EOL).encode())
+
+        approval, received = self.receive_approval()
+        if approval is None:
+            raise ConnectionResetError('Server closed the connection during the identity handshake')
+
+        attributes = approval.split()
+        if attributes[:1] != [SOCKET_ID_APPROVED] or (self.protocol and self.protocol not in attributes):
+            print('raised exception')
+            raise Exception('Unknown identity ' + self.identity)
+
+        # A server that stops responding is noticed through the heartbeats from now on
+        self.connection.settimeout(None)
+
+        if SOCKET_PROTOCOL_DATAGRAM in attributes:
+            self.open_datagram(int(attributes[attributes.index(SOCKET_PROTOCOL_DATAGRAM) + 1]))
+
+        self.heartbeat_timeout = 0.0
+        if SOCKET_PROTOCOL_HEARTBEAT in attributes:
+            interval = float(attributes[attributes.index(SOCKET_PROTOCOL_HEARTBEAT) + 1])
+            self.heartbeat_timeout = interval * SOCKET_HEARTBEAT_MISSES
+        self.last_received = time.monotonic()
+
+        # Messages sent right after the approval arrive in the same read
+        self.decoder = self.decoder_class()
+        self.pending = self.decoder.feed(received)
+
+        # Held commands go out before anything that is sent after the connection is marked connected
+        with self.lock:
+            frames = self.outbox.take()
+            if frames:
+                print('Sending', len(frames), 'commands held while disconnected')
+                self.write(frames)
 
             self.connected = True
-        except socket.error as exception:
-            print('Failed to connect to server:', exception)
 
-            if times_retrying > 0:
-                print('Retrying in 2 seconds (' + str(times_retrying - 1) + ' attempts left)')
-                time.sleep(2)
-                return self.connect(times_retrying - 1)
+    def open_connection(self) -> socket:
+        """Connects over the Unix domain socket of the server if available, over TCP otherwise.
 
-            return False
+        Connecting and the identity handshake time out after SOCKET_CONNECT_TIMEOUT, so that an unreachable host
+        does not block for the connect timeout of the operating system.
+        """
+        if self.unix_path and os.path.exists(self.unix_path):
+            print('Connecting to local host', self.unix_path)
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(SOCKET_CONNECT_TIMEOUT)
 
-        print('Connection established')
-        self.connected = True
-        return True
+            try:
+                connection.connect(self.unix_path)
+                return connection
+            except socket.error as exception:
+                connection.close()
+                print('Failed to connect to local host:', exception)
+
+        print('Connecting to remote host', self.host + ':' + str(self.port))
+        connection = socket.socket()
+        connection.settimeout(SOCKET_CONNECT_TIMEOUT)
+
+        try:
+            connection.connect((self.host, self.port))
+        except socket.error:
+            connection.close()
+            raise
+
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection
+
+    def close_connection(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
 
     def disconnect(self) -> None:
         print('Closing connection')
+        self.connected = False
 
         if self.on_disconnect:
             self.on_disconnect()
 
-        # 0 = done receiving, 1 = done sending, 2 = both
-        self.connection.close()
-        self.connected = False
+        self.close_connection()
+        self.close_datagram()
+
+    def open_datagram(self, token: int) -> None:
+        """Opens the UDP channel approved by the server and announces its address."""
+        self.close_datagram()
+        self.datagram = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.datagram.connect((self.host, self.port))
+        self.datagram.setblocking(False)
+        self.token = token
+        self.sequences = Datagram.SequenceFilter()
+        self.announce()
+        print('Opened UDP channel')
+
+    def close_datagram(self) -> None:
+        if self.datagram is not None:
+            self.datagram.close()
+            self.datagram = None
+
+    def announce(self) -> None:
+        """Lets the server learn and remember the address of the UDP channel."""
+        self.announced = time.time()
+        self.send_datagram(b'')
 
     def listen(self, callback, reconnect=True) -> None:
         print('Started listening')
         try:
             while True:
                 try:
-                    # Use select so that as soon as the connection fails, we will be able to reconnect
+                    while self.pending:
+                        self.deliver(callback, self.pending.pop(0))
+
+                    # Block until a message arrives, a closed connection is readable too so that we can reconnect
+                    readers = [self.connection] + ([self.datagram] if self.datagram is not None else [])
                     ready_to_read, ready_to_write, in_error = select.select(
-                        [self.connection, ], [self.connection, ], [], 5
+                        readers, [], [], self.heartbeat_timeout or 5
                     )
 
-                    if len(ready_to_read) > 0:
-                        recv = self.receive()
+                    if self.datagram is not None:
+                        if self.datagram in ready_to_read:
+                            for message in self.receive_datagram():
+                                self.deliver(callback, message)
+
+                        # Keep the address known to the server, e.g. through NAT
+                        if time.time() - self.announced > 5:
+                            self.announce()
 
-                        if not recv:
-                            print('Server left the room')
-                            self.disconnect()
+                    if self.connection in ready_to_read:
+                        messages = self.receive()
+                    elif self.heartbeat_timeout and time.monotonic() - self.last_received > self.heartbeat_timeout:
+                        print('Server stopped sending heartbeats')
+                        messages = None
+                    else:
+                        messages = []
 
-                            if not reconnect:
-                                break
+                    if messages is None:
+                        print('Server left the room')
+                        self.disconnect()
 
-                            if not self.connect():
-                                break
+                        if not reconnect:
+                            break
 
-                            continue
+                        if not self.connect():
+                            break
 
-                        messages = recv.strip(SOCKET_EOL).split(SOCKET_EOL)
-                        for message in messages:
-                            callback(message)
+                        continue
+
+                    for message in messages:
+                        self.deliver(callback, message)
 
                 except select.error as exception:
                     print('Connection error:', exception)
-                    self.connected = False
+                    self.disconnect()
 
                     if not reconnect:
                         break
 
                     if not self.connect():
                         break
-
-                time.sleep(0.1)
         except KeyboardInterrupt:
             self.disconnect()
 
+    def receive_approval(self):
+        """Reads the approval of the identity, returns it together with the bytes received after it."""
+        delimiter = SOCKET_EOL.encode()
+        data = b''
+
+        while delimiter not in data:
+            received = self.connection.recv(4096)
+
+            if not received:
+                return None, b''
+
+            data += received
+
+        approval, received = data.split(delimiter, 1)
+        return approval.decode(), received
+
     def receive(self):
-        return self.connection.recv(1024).decode()
+        """Blocks until at least one complete message arrived, returns None when the server left."""
+        while True:
+            data = self.connection.recv(4096)
+
+            if not data:
+                return None
+
+            self.last_received = time.monotonic()
+            messages = self.decoder.feed(data)
+            if messages:
+                return messages
+
+    def receive_datagram(self) -> list:
+        """Reads all waiting datagrams, returns their messages unless they are older than what was received already."""
+        messages = []
+
+        while True:
+            try:
+                data = self.datagram.recv(65536)
+            except OSError:
+                return messages
+
+            if len(data) < Datagram.HEADER.size:
+                continue
+
+            token, sequence = Datagram.HEADER.unpack_from(data)
+            for message in Datagram.decode(self.datagram_decoder, data[Datagram.HEADER.size:]):
+                if self.sequences.accept(self.command(message), sequence):
+                    messages.append(message)
+
+    def command(self, message) -> str:
+        """Name of the command of a received message."""
+        return message.partition(' ')[0]
+
+    def deliver(self, callback, message) -> None:
+        """Answers heartbeats of the server, every other message goes to the callback."""
+        if self.command(message) == SOCKET_PING:
+            self.send_command(SOCKET_PONG)
+            return
+
+        self.dispatch(callback, message)
+
+    def dispatch(self, callback, message) -> None:
+        callback(message)
 
     def send(self, message: str) -> bool:
+        return self.transmit([(message.partition(' ')[0], (message + SOCKET_EOL).encode())])
+
+    def send_datagram(self, data: bytes) -> bool:
         try:
-            self.connection.send((message + SOCKET_EOL).encode())
+            self.datagram.send(Datagram.pack(self.token, next(self.sequence), data))
             return True
-        except:
+        except (AttributeError, OSError):
             return False
 
+    def encode(self, command: str, params: tuple) -> bytes:
+        return (' '.join([command] + [str(i) for i in list(params)]) + SOCKET_EOL).encode()
+
     def send_command(self, command: str, *params) -> bool:
-        payload = ' '.join([command] + [str(i) for i in list(params)])
-        return self.send(payload)
+        """Sends a command, joystick commands go over the UDP channel when it is open.
+
+        Commands sent while disconnected are held in the outbox and sent once reconnected, True means the
+        command was sent or held.
+        """
+        try:
+            data = self.encode(command, params)
+        except (KeyError, ValueError, struct.error):
+            print('Unable to encode', command)
+            return False
+
+        return self.transmit([(command, data)])
+
+    def batch(self) -> CommandBatch:
+        """Collects commands that are sent with a single write, e.g. the steering and speed of one update."""
+        return CommandBatch(self)
+
+    def send_batch(self, commands: list) -> bool:
+        """Sends a list of (command, params) with one vectored write, joystick commands share one datagram when
+        the UDP channel is open."""
+        encoded = []
+
+        for command, params in commands:
+            try:
+                encoded.append((command, self.encode(command, params)))
+            except (KeyError, ValueError, struct.error):
+                print('Unable to encode', command)
+                return False
+
+        return self.transmit(encoded)
+
+    def transmit(self, encoded: list) -> bool:
+        """Sends a list of (command, data), or holds them in the outbox when there is no connection."""
+        with self.lock:
+            if not self.connected:
+                return self.hold(encoded)
+
+            streamed = []
+            datagrams = []
+
+            for command, data in encoded:
+                if self.datagram is not None and command in SOCKET_DATAGRAM_COMMANDS:
+                    datagrams.append(data)
+                else:
+                    streamed.append((command, data))
+
+            sent = not datagrams or self.send_datagram(b''.join(datagrams))
+
+            if streamed and not self.write([data for command, data in streamed]):
+                return self.hold(streamed) and sent
+
+            return sent
+
+    def hold(self, encoded: list) -> bool:
+        """Keeps commands for after reconnecting, a newer command on the same control channel replaces an older."""
+        held = False
+
+        for command, data in encoded:
+            if command not in SOCKET_OUTBOX_EXCLUDED:
+                held = self.outbox.put(data, SOCKET_CONFLATE_CHANNELS.get(command)) or held
+
+        return held
+
+    def write(self, frames: list) -> bool:
+        """Writes frames to the connection, gathered by the kernel where sendmsg is available."""
+        try:
+            if not hasattr(self.connection, 'sendmsg'):
+                self.connection.sendall(b''.join(frames))
+                return True
+
+            sent = self.connection.sendmsg(frames)
+            if sent < sum(len(frame) for frame in frames):
+                self.connection.sendall(b''.join(frames)[sent:])
+            return True
+        except (AttributeError, OSError):
+            return False
 
 
 if __name__ == '__main__':
@@ -128,7 +419,7 @@ if __name__ == '__main__':
 
 
     print('Enter identity:')
-    client = SocketClient('id_' + input(), on_disconnect)
+    client = SocketClient('id_' + input(), on_disconnect, heartbeat=True)
 
     if client.connect():
         Thread(target=communicate, args=(client,), daemon=True).start()
@@ -0,0 +1,289 @@
+import re
+import socket
+import struct
+import time
+from itertools import count
+from time import perf_counter
+
+import SocketServer
+from lib import BinaryProtocol, Datagram
+from lib.BinaryProtocol import BinaryFrameDecoder
+from lib.commands import COMMANDS, SOCKET_IDENTITIES
+from lib.constants import *
+from lib.FrameDecoder import FrameDecoder
+from lib.Metrics import IdentityMetrics
+from lib.OutboundQueue import OutboundQueue
+
+
+# Instance numbers as documented, e.g. the 2 of id_vehicle@2
+INSTANCE = re.compile('[0-9]{1,' + str(len(str(SOCKET_INSTANCE_MAX))) + '}')
+
+
+def valid_instance(instance: str) -> bool:
+    return INSTANCE.fullmatch(instance) is not None and int(instance) <= SOCKET_INSTANCE_MAX
+
+
+class SocketServerClient:
+    """Protocol handling shared by every type of connection served by the SocketServer."""
+
+    def __init__(self, server: SocketServer, conn: socket):
+        self.server: SocketServer = server
+        self.conn: socket = conn
+        self.identity: str = None
+        self.role: str = None
+        self.instance: str = None
+        self.scopes = {}
+        self.client = None
+        self.commands = {}
+        self.decoder = FrameDecoder()
+        self.binary = False
+        self.queue = OutboundQueue(server.queue_size, server.queue_policy)
+
+        # Replaced by the shared metrics of the identity once approved
+        self.metrics = IdentityMetrics()
+
+        # UDP channel of clients that requested it, the address is learned from their datagrams
+        self.udp = False
+        self.token = 0
+        self.address = None
+        self.sequence = count(1)
+        self.sequences = Datagram.SequenceFilter()
+        self.datagram_decoder = None
+
+        # Heartbeat interval of clients that asked to be pinged, they are lost when silent for too long
+        self.heartbeat = 0.0
+        self.last_seen = time.monotonic()
+
+    def identify(self, message: str):
+        """Assigns the commands and fallback handler based on identification, optionally followed by the
+        requested protocol."""
+        attributes = message.split()
+        self.identity = attributes.pop(0) if attributes else message
+        self.binary = SOCKET_PROTOCOL_BINARY in attributes
+        self.udp = SOCKET_PROTOCOL_DATAGRAM in attributes
+
+        # Role is the identity without the instance number of addressable clients
+        self.role, separator, self.instance = self.identity.partition(SOCKET_ID_SEPARATOR)
+        if self.role not in SOCKET_IDENTITIES or (separator and not valid_instance(self.instance)):
+            raise Exception('Unknown identification: ' + self.identity[:64])
+
+        # The same number is the same instance, e.g. id_vehicle@02 is id_vehicle@2
+        if separator:
+            self.instance = str(int(self.instance))
+            self.identity = self.role + SOCKET_ID_SEPARATOR + self.instance
+
+        self.commands = COMMANDS.table(self.role)
+
+        if SOCKET_PROTOCOL_HEARTBEAT in attributes:
+            self.heartbeat = self.server.heartbeat_intervals.get(self.role, 0.0)
+
+        if self.role == SOCKET_ID_FAKE:
+            return self.client_fake
+
+        return self.client_unknown
+
+    def approve(self, messages: list) -> list:
+        """Confirms the identity, after which the connection switches to the requested protocol.
+
+        The approval repeats the requested protocol and holds the token of the UDP channel if that was requested
+        and the server offers it. Returns the messages received after the identity, decoded in the requested
+        protocol.
+        """
+        self.metrics = self.server.metrics.connect(self.identity)
+        self.datagram_decoder = BinaryFrameDecoder() if self.binary else FrameDecoder()
+
+        approval = [SOCKET_ID_APPROVED]
+        if self.binary:
+            approval.append(SOCKET_PROTOCOL_BINARY)
+
+        if self.udp and self.server.datagram is not None:
+            self.token = self.server.open_datagram(self)
+            approval += [SOCKET_PROTOCOL_DATAGRAM, str(self.token)]
+
+        if self.heartbeat:
+            approval += [SOCKET_PROTOCOL_HEARTBEAT, str(self.heartbeat)]
+
+        self.write((' '.join(approval) + SOCKET_EOL).encode())
+        self.server.register(self)
+
+        if self.heartbeat:
+            self.server.wheel.schedule(self.heartbeat, self.on_heartbeat)
+
+        if not self.binary:
+            return messages
+
+        received = bytes(self.decoder.buffer)
+        self.decoder = BinaryFrameDecoder()
+        return self.decoder.feed(received)
+
+    def on_message(self, message):
+        """When receiving a message from connected client, either text or a decoded binary frame."""
+        if self.binary:
+            name, params = message
+            command = self.commands.get(name)
+        else:
+            name, separator, text = message.partition(' ')
+            command = self.commands.get(name)
+
+            try:
+                params = command.parse(text) if command else text.split()
+            except ValueError:
+                command = None
+                params = text.split()
+
+        if command is None:
+            handled = self.client(name, params)
+        elif command.target is not None:
+            # The server stamps traces with the time it relays them
+            if name == SOCKET_TRACE:
+                params = params[:3] + (time.time(),)
+
+            started = perf_counter()
+            route = self.scope(command.target)
+            handled = self.server.broadcast(route, name, *params)
+            self.metrics.route(route).observe(perf_counter() - started)
+
+            if self.server.recorder is not None:
+                self.server.recorder.record(self.identity, route, name, params)
+        else:
+            handled = self.client_global(name, params)
+
+        if not handled:
+            self.metrics.unknown += 1
+            self.send(SOCKET_ERR_UNKNOWN_CMD)
+
+    def on_datagram(self, sequence: int, payload: bytes, address):
+        """Handles a datagram of this client, stale datagrams and commands that must use TCP are dropped."""
+        self.address = address
+
+        self.last_seen = time.monotonic()
+
+        # Empty datagrams only announce the address
+        if not payload:
+            return
+
+        for message in Datagram.decode(self.datagram_decoder, payload):
+            name = message[0] if self.binary else message.partition(' ')[0]
+
+            if name in SOCKET_DATAGRAM_COMMANDS and self.sequences.accept(name, sequence):
+                self.metrics.messages_in += 1
+                self.metrics.bytes_in += len(payload)
+                self.on_message(message)
+
+    def scope(self, target: str) -> str:
+        """Route of a target for this client, clients with an instance number only reach the same instance."""
+        if not self.instance:
+            return target
+
+        route = self.scopes.get(target)
+        if route is None:
+            route = self.scopes[target] = target + SOCKET_ID_SEPARATOR + self.instance
+
+        return route
+
+    def routes(self) -> set:
+        """Routes that reach this client: its identity and, for clients with an instance number, its role."""
+        return {self.identity, self.role}
+
+    def send(self, command, *params):
+        data = self.encode(command, params[0] if params else ())
+        return data is not None and self.write(data)
+
+    def encode(self, command: str, params=()) -> bytes:
+        """Serializes a message in the protocol of this connection, None if it cannot be represented."""
+        if self.binary:
+            try:
+                return BinaryProtocol.encode(command, params)
+            except (KeyError, ValueError, struct.error):
+                print('Unable to encode', command, 'for', self.identity)
+                return None
+
+        if len(params) >= 1:
+            command += ' ' + ' '.join(str(param) for param in params)
+
+        message = command.strip() + SOCKET_EOL
+        return message.encode()
+
+    def write(self, data: bytes, channel: str = None) -> bool:
+        """Queues raw bytes for the writer of the connection type, never blocks on the network.
+
+        Only the latest pending message is kept for a channel, see SOCKET_CONFLATE_CHANNELS.
+        """
+        if self.queue.put(data, channel, notify=False):
+            self.on_queued()
+            return True
+
+        print('Outbound queue of', self.identity, 'overflowed')
+        self.disconnect()
+        return False
+
+    def write_datagram(self, data: bytes) -> bool:
+        """Sends a message over UDP, it is either delivered right away or lost."""
+        try:
+            self.server.datagram.sendto(Datagram.pack(self.token, next(self.sequence), data), self.address)
+        except OSError:
+            return False
+
+        self.metrics.messages_out += 1
+        self.metrics.bytes_out += len(data)
+        return True
+
+    def on_heartbeat(self):
+        """Pings the client every interval and disconnects it once it missed too many pings."""
+        if self.queue.closed:
+            return
+
+        if time.monotonic() - self.last_seen > self.heartbeat * SOCKET_HEARTBEAT_MISSES:
+            print('Connection with identity', self.identity, 'went silent')
+            self.disconnect()
+            return
+
+        self.send(SOCKET_PING)
+        self.server.wheel.schedule(self.heartbeat, self.on_heartbeat)
+
+    def on_received(self, data: bytes, messages: list):
+        self.last_seen = time.monotonic()
+        self.metrics.messages_in += len(messages)
+        self.metrics.bytes_in += len(data)
+
+    def on_written(self, data: bytes, frames: list):
+        self.metrics.messages_out += len(frames)
+        self.metrics.bytes_out += len(data)
+        self.metrics.queue_wait.observe(self.queue.waited)
+
+    def on_queued(self):
+        """Wakes up the writer, implemented by the connection type."""
+        raise NotImplementedError
+
+    def disconnect(self):
+        """Shuts the connection down, the reader notices and cleans up."""
+        print('Disconnecting connection with identity', self.identity)
+
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def client_global(self, command, payload):
+        if command == SOCKET_DISCONNECT:
+            raise Disconnect
+
+        if command == SOCKET_PING:
+            return self.send(SOCKET_PONG)
+
+        # Lets the client estimate the offset of its clock to the clock of the server
+        if command == SOCKET_CLOCK:
+            return self.send(SOCKET_CLOCK, (payload[0], time.time()))
+
+        return True
+
+    def client_unknown(self, command, payload):
+        return False
+
+    def client_fake(self, command, payload):
+        print('Received:', command, payload)
+        return True
+
+
+class Disconnect(ValueError):
+    pass
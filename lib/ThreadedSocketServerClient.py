@@ -4,26 +4,43 @@ import sys
 
 import SocketServer
 from lib.constants import *
-from threading import Thread
+from lib.FrameDecoder import FrameError
+from lib.SocketServerClient import SocketServerClient, Disconnect
+from threading import Thread, local
 
+# Clients that received messages while the current thread handles a read, their writers are woken afterwards
+batch = local()
 
-class ThreadedSocketServerClient(Thread):
+
+class ThreadedSocketServerClient(SocketServerClient, Thread):
     def __init__(self, server: SocketServer, conn: socket):
         Thread.__init__(self)
+        SocketServerClient.__init__(self, server, conn)
         self.daemon = True
 
-        self.server: SocketServer = server
-        self.conn: socket = conn
-        self.identity: str = None
-        self.client = None
-
     def run(self):
-        # try:
-        self.client = self.identify()
-        self.conn.sendall(SOCKET_ID_APPROVED.encode())
-        print('Connected', self.identity)
-        self.listen()
-        print('Disconnected', self.identity)
+        Thread(target=self.drain, daemon=True).start()
+
+        try:
+            messages = self.receive()
+            if not messages:
+                return
+
+            self.client = self.identify(messages.pop(0))
+            messages = self.approve(messages)
+            print('Connected', self.identity)
+
+            # Messages sent right after the identity arrive in the same read
+            self.handle(messages)
+
+            self.listen()
+        except Disconnect:
+            pass
+        finally:
+            print('Disconnected', self.identity)
+            self.server.unregister(self)
+            self.queue.close()
+            self.conn.close()
 
     # except Exception as e:
     #     exc_type, exc_obj, exc_tb = sys.exc_info()
@@ -31,118 +48,73 @@ class ThreadedSocketServerClient(Thread):
     #     print('EXCEPTION:', e, 'in ' + fname + ' line ' + str(exc_tb.tb_lineno))
     #     self.disconnect()
 
-    def identify(self):
-        """Assigns client based on identification."""
-        self.identity = self.conn.recv(1024).decode().strip(SOCKET_EOL)
-
-        if self.identity == SOCKET_ID_RECOGNITION:
-            return self.client_recognition
-
-        if self.identity == SOCKET_ID_VEHICLE:
-            return self.client_vehicle
-
-        if self.identity == SOCKET_ID_JOYSTICK:
-            return self.client_joystick
-
-        if self.identity == SOCKET_ID_FAKE:
-            return self.client_fake
-
-        raise Exception('Unknown identification: ' + self.identity)
-
     def listen(self):
         while True:
             try:
-                data = self.conn.recv(1024)
+                messages = self.receive()
             except ConnectionResetError:
                 break
-            except Disconnect:
-                break
 
             # On disconnect
-            if not data:
+            if messages is None:
                 return
 
-            # Due to busy traffic data can be attached to each other
-            messages = data.decode().strip(SOCKET_EOL).split(SOCKET_EOL)
-            for message in messages:
-                self.on_message(message)
+            self.handle(messages)
 
-    def on_message(self, message: str):
-        """When receiving a message from connected client."""
-        attributes = message.split()
+    def handle(self, messages: list):
+        """Handles the messages of a read in one pass, each recipient gets all of its messages in a single write."""
+        clients = batch.clients = set()
 
-        if len(attributes) >= 1:
-            command = attributes.pop(0)
-
-            if not self.client_global(command, attributes) or not self.client(command, attributes):
-                self.send(SOCKET_ERR_UNKNOWN_CMD)
-
-    def send(self, command, *params):
-        if len(params) >= 1:
-            command += ' ' + ' '.join(params[0])
-
-        message = command.strip() + SOCKET_EOL
         try:
-            self.conn.sendall(message.encode())
-            return True
-        except BrokenPipeError:
-            return False
-
-    def disconnect(self):
-        print('Disconnecting connection with identity', self.identity)
-        self.conn.close()
-
-    def client_global(self, command, payload):
-        if command == SOCKET_DISCONNECT:
-            raise Disconnect
-
-        return True
-
-    def client_vehicle(self, command: str, payload):
-        print('Vehicle')
-        return False
-
-    def client_joystick(self, command, payload):
-        if command == SOCKET_JOY_FORWARD:
-            speed = '0'
-            if len(payload) >= 1:
-                speed = payload[0]
-            return self.server.broadcast(SOCKET_ID_VEHICLE, SOCKET_JOY_FORWARD, speed)
+            for message in messages:
+                self.on_message(message)
+        finally:
+            batch.clients = None
 
-        if command == SOCKET_JOY_BACKWARD:
-            speed = '0'
-            if len(payload) >= 1:
-                speed = payload[0]
-            return self.server.broadcast(SOCKET_ID_VEHICLE, SOCKET_JOY_BACKWARD, speed)
+            for client in clients:
+                client.queue.notify()
 
-        if command == SOCKET_JOY_NEUTRAL:
-            return self.server.broadcast(SOCKET_ID_VEHICLE, SOCKET_JOY_NEUTRAL)
+    def receive(self):
+        """Blocks until at least one complete message arrived, returns None on disconnect."""
+        while True:
+            data = self.conn.recv(4096)
 
-        if command == SOCKET_JOY_DIR_LEFT:
-            return self.server.broadcast(SOCKET_ID_VEHICLE, SOCKET_JOY_DIR_LEFT)
+            if not data:
+                return None
 
-        if command == SOCKET_JOY_DIR_RIGHT:
-            return self.server.broadcast(SOCKET_ID_VEHICLE, SOCKET_JOY_DIR_RIGHT)
+            try:
+                messages = self.decoder.feed(data)
+            except FrameError as exception:
+                print('Dropping connection with identity', self.identity, exception)
+                return None
 
-        if command == SOCKET_JOY_DIR_NEUTRAL:
-            return self.server.broadcast(SOCKET_ID_VEHICLE, SOCKET_JOY_DIR_NEUTRAL)
+            self.on_received(data, messages)
 
-        return False
+            if messages:
+                return messages
 
-    def client_recognition(self, command, payload):
-        if command == SOCKET_RECOGNITION_DETECTED:
-            print('[BROADCAST] Person detected')
-            return self.server.broadcast(SOCKET_ID_VEHICLE, SOCKET_RECOGNITION_DETECTED)
+    def on_queued(self):
+        """Wakes up the writer thread, or once the read that is being handled by this thread is done."""
+        clients = getattr(batch, 'clients', None)
 
-        if command == SOCKET_RECOGNITION_FREE:
-            return self.server.broadcast(SOCKET_ID_VEHICLE, SOCKET_RECOGNITION_FREE)
+        if clients is None:
+            self.queue.notify()
+        else:
+            clients.add(self)
 
-        return False
+    def drain(self):
+        """Writes queued messages so that a slow receiver only blocks its own writer thread."""
+        while True:
+            frames = self.queue.get()
 
-    def client_fake(self, command, payload):
-        print('Received:', command, payload)
-        return True
+            if frames is None:
+                return
 
+            data = b''.join(frames)
+            try:
+                self.conn.sendall(data)
+            except OSError:
+                self.queue.close()
+                return
 
-class Disconnect(ValueError):
-    pass
+            self.on_written(data, frames)
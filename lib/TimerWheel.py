@@ -0,0 +1,53 @@
+import time
+from threading import Thread, Lock
+from typing import Callable
+
+
+class TimerWheel(Thread):
+    """Hashed timer wheel, scheduling a timer and firing it are O(1) regardless of the number of timers.
+
+    Timers are kept in the slot of the tick they are due, timers that are due more than one
+    revolution ahead count down the remaining revolutions. Callbacks run on the thread of the wheel.
+    """
+
+    def __init__(self, tick: float = 0.01, slots: int = 512):
+        Thread.__init__(self, name='TimerWheel')
+        self.daemon = True
+
+        self.tick = tick
+        self.slots = [[] for i in range(slots)]
+        self.position = 0
+        self.lock = Lock()
+
+    def schedule(self, delay: float, callback: Callable[[], None]):
+        """Calls the callback after at least the delay, rounded up to whole ticks."""
+        ticks = max(1, int(-(-delay // self.tick)))
+
+        with self.lock:
+            slot = (self.position + ticks - 1) % len(self.slots)
+            self.slots[slot].append([(ticks - 1) // len(self.slots), callback])
+
+    def run(self):
+        next_tick = time.monotonic() + self.tick
+
+        while True:
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            self.advance()
+            next_tick += self.tick
+
+    def advance(self):
+        """Fires the timers of the current slot and moves on to the next one."""
+        with self.lock:
+            timers = self.slots[self.position]
+            due = [callback for rounds, callback in timers if rounds == 0]
+            self.slots[self.position] = [[rounds - 1, callback] for rounds, callback in timers if rounds > 0]
+            self.position = (self.position + 1) % len(self.slots)
+
+        for callback in due:
+            try:
+                callback()
+            except Exception as exception:
+                print('Timer failed:', exception)
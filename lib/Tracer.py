@@ -0,0 +1,143 @@
+import time
+from collections import deque
+from itertools import count
+from threading import Lock, Thread
+from typing import Dict
+
+from lib.Metrics import Histogram
+from lib.constants import *
+
+# Hops of a traced command, every stamp is converted to the clock of the server
+TRACE_HOPS = (
+    'input',  # Joystick input read until the command was sent
+    'uplink',  # Sent by the joystick until relayed by the server
+    'downlink',  # Relayed by the server until received by the vehicle
+    'dispatch',  # Received by the vehicle until handed to the controller
+    'apply',  # Handed to the controller until the control loop wrote it to the actuators
+    'total',  # Joystick input read until written to the actuators
+)
+
+
+class Tracer:
+    """Opt-in latency tracing of commands from the joystick to the actuators of the vehicle.
+
+    The joystick follows a traced command with a trace message holding its input and send time, the
+    server stamps the time it relayed it and the vehicle adds the times it received and handled the
+    command, and the time its control loop committed it to the actuators. Each host estimates the
+    offset of its clock to the server over its own connection, so that all stamps compare on the
+    clock of the server.
+
+    A trace only lines up with its command when both take the same path, so traced clients keep all
+    commands on TCP instead of opening the UDP channel.
+    """
+
+    def __init__(self, client, interval: float = 10):
+        self.client = client
+
+        if client.udp:
+            print('Tracing sends joystick commands over TCP instead of UDP')
+            client.udp = False
+        self.interval = interval
+        self.numbers = count(1)
+
+        # Offset of the sample with the shortest round trip, which has the smallest error
+        self.samples = deque(maxlen=8)
+        self.offset = 0.0
+
+        self.hops: Dict[str, Histogram] = {hop: Histogram() for hop in TRACE_HOPS}
+
+        # Local receive and handle time of the last received command, and the version of the control loop it set
+        self.received = 0.0
+        self.handled = 0.0
+        self.version = 0
+
+        # Control loop that writes the actuators, its last commit and the traces that wait for a commit
+        self.loop = None
+        self.commit = (0, 0.0)
+        self.pending = deque(maxlen=16)
+        self.lock = Lock()
+
+    def follow(self, loop):
+        """Ends traces when the control loop committed the command, instead of when it was handed to it."""
+        self.loop = loop
+        loop.on_commit = self.on_commit
+
+    def start(self):
+        Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        """Samples the clock offset quickly at first, then keeps it up-to-date and reports the hops."""
+        for i in range(self.samples.maxlen):
+            self.synchronize()
+            time.sleep(0.1)
+
+        while True:
+            time.sleep(self.interval)
+            self.synchronize()
+            self.report()
+
+    def synchronize(self):
+        if self.client.connected:
+            self.client.send_command(SOCKET_CLOCK, time.time(), 0.0)
+
+    def on_clock(self, sent: float, server: float):
+        """Handles the answer of the server, the offset assumes the network delay is equal both ways."""
+        received = time.time()
+        self.samples.append((received - sent, server - (sent + received) / 2))
+        self.offset = min(self.samples)[1]
+
+    def trace(self, changed: float, sender=None) -> bool:
+        """Sends the trace of the command that was sent last, changed is the local time of its input.
+
+        The sender, e.g. the batch of the command, defaults to the client.
+        """
+        return (sender or self.client).send_command(SOCKET_TRACE, next(self.numbers), changed + self.offset,
+                                                    time.time() + self.offset, 0.0)
+
+    def on_command(self, received: float, handled: float):
+        """Remembers the local times the vehicle received and handled a command, in case a trace follows."""
+        self.received = received
+        self.handled = handled
+        self.version = self.loop.version if self.loop else 0
+
+    def on_trace(self, number: int, changed: float, sent: float, relayed: float):
+        stamps = (changed, sent, relayed, self.received + self.offset, self.handled + self.offset)
+
+        if self.loop is None:
+            # Without a control loop the command was written to the actuators while it was handled
+            self.observe(*stamps, stamps[-1])
+            return
+
+        # The loop can commit the command before its trace arrives
+        with self.lock:
+            version, committed = self.commit
+            if version >= self.version:
+                self.observe(*stamps, committed + self.offset)
+            else:
+                self.pending.append((self.version, stamps))
+
+    def on_commit(self, version: int, committed: float):
+        """Called by the control loop, ends the traces that wait for this or an earlier version of the loop."""
+        with self.lock:
+            self.commit = (version, committed)
+
+            while self.pending and version >= self.pending[0][0]:
+                self.observe(*self.pending.popleft()[1], committed + self.offset)
+
+    def observe(self, changed: float, sent: float, relayed: float, received: float, handled: float, applied: float):
+        self.hops['input'].observe(sent - changed)
+        self.hops['uplink'].observe(relayed - sent)
+        self.hops['downlink'].observe(received - relayed)
+        self.hops['dispatch'].observe(handled - received)
+        self.hops['apply'].observe(applied - handled)
+        self.hops['total'].observe(applied - changed)
+
+    def report(self):
+        for hop in TRACE_HOPS:
+            histogram = self.hops[hop]
+            if not histogram.count():
+                continue
+
+            print('Trace', hop, 'count=' + str(histogram.count()),
+                  'p50<=' + str(histogram.quantile(0.5)), 'p99<=' + str(histogram.quantile(0.99)),
+                  'buckets=' + ','.join(str(count) for count in histogram.counts))
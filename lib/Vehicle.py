@@ -1,96 +1,127 @@
-from threading import Thread
-
 from controllers import Controller
+from controllers.ControlLoop import ControlLoop
+from lib.BinarySocketClient import BinarySocketClient
+from lib.DeadlineScheduler import DeadlineScheduler
 from lib.SocketClient import SocketClient
+from lib.Tracer import Tracer
+from lib.commands import COMMANDS
 from lib.constants import *
+import os
 import time
 
 
 class Vehicle:
     def __init__(self, controller: Controller):
+        # Commands only publish the desired state, the control loop writes the actuators at a fixed rate
+        rate = float(os.getenv('VEHICLE_CONTROL_RATE', '100'))
+        if rate > 0:
+            controller = ControlLoop(controller, rate, float(os.getenv('VEHICLE_MAX_ACCELERATION', '0')),
+                                     float(os.getenv('VEHICLE_STEERING_RATE', '0')))
+
         self.controller = controller
-        self.client = SocketClient(SOCKET_ID_VEHICLE)
+        self.binary = os.getenv('SOCKET_PROTOCOL') == SOCKET_PROTOCOL_BINARY
+        client_class = BinarySocketClient if self.binary else SocketClient
+        self.client = client_class(SOCKET_ID_VEHICLE, on_disconnect=self.on_disconnect, heartbeat=True)
         self.last_message = time.time()
         self.blocked = False
-        self.blocked_since = None
+        self.tracer = Tracer(self.client) if os.getenv('SOCKET_TRACE') == '1' else None
+
+        self.dispatcher = COMMANDS.dispatcher({
+            SOCKET_JOY_FORWARD: self.forward,
+            SOCKET_JOY_BACKWARD: self.reverse,
+            SOCKET_JOY_NEUTRAL: self.controller.neutral,
+            SOCKET_JOY_DIR_NEUTRAL: self.controller.steer_neutral,
+            SOCKET_JOY_DIR_LEFT: self.controller.steer_left,
+            SOCKET_JOY_DIR_RIGHT: self.controller.steer_right,
+            SOCKET_RECOGNITION_DETECTED: self.detected,
+            SOCKET_RECOGNITION_FREE: self.free,
+        })
+
+        # Seconds until neutral when no message arrives, and that a detected person blocks the vehicle
+        self.timeout = float(os.getenv('VEHICLE_TIMEOUT', '1'))
+        self.block_hold = float(os.getenv('VEHICLE_BLOCK_HOLD', '1'))
+        self.deadlines = DeadlineScheduler()
+
+        if self.tracer:
+            if isinstance(self.controller, ControlLoop):
+                self.tracer.follow(self.controller)
+
+            self.dispatcher = COMMANDS.dispatcher(dict(self.dispatcher.handlers, **{
+                SOCKET_CLOCK: self.tracer.on_clock,
+                SOCKET_TRACE: self.tracer.on_trace,
+            }))
+
+    def start(self):
+        """Starts the control loop and the failsafes, listen does so as well."""
+        if isinstance(self.controller, ControlLoop):
+            self.controller.start()
+
+        # Every received message re-arms the timeout
+        self.deadlines.start()
+        self.deadlines.arm('timeout', self.timeout, self.on_timeout)
 
     def listen(self):
         self.client.connect(999999)
+        self.start()
 
-        # Start thread to watch for timeouts
-        Thread(target=self.timeout_watcher, daemon=True).start()
-
-        self.client.listen(self.on_message)
-
-    def timeout_watcher(self):
-        """Puts vehicle in neutral if no message was received in the last 1 second."""
-        while True:
-            now = time.time()
-
-            # Put vehicle into neutral after 1 second
-            if (now - self.last_message) > 1:
-                self.controller.neutral()
+        if self.tracer:
+            self.tracer.start()
 
-            # Force vehicle into neutral
-            if self.blocked:
-                # Make sure we are blocking at least for 5 seconds after the last person was detected
-                if (now - self.blocked_since) > 1:
-                    self.unblock()
-                    continue
+        self.client.listen(self.on_command if self.binary else self.on_message)
 
-                self.controller.neutral()
+    def on_timeout(self):
+        """Puts vehicle in neutral when no message was received within the timeout."""
+        print('No message received in', self.timeout, 'seconds')
+        self.controller.neutral()
 
-            time.sleep(0.5)
+    def on_disconnect(self):
+        """Stops right away when the server is lost, instead of waiting for the timeout."""
+        print('Lost connection to the server')
+        self.controller.neutral()
 
     def block(self):
+        """Forces vehicle into neutral, accelerating is ignored until the hold after the last detection passed."""
         self.controller.neutral()
-        self.blocked_since = time.time()
         self.blocked = True
+        self.deadlines.arm('block', self.block_hold, self.unblock)
 
     def unblock(self):
-        self.blocked_since = None
+        self.deadlines.cancel('block')
         self.blocked = False
 
     def on_message(self, message: str):
-        payload = message.split(' ')
+        received = time.time()
+        self.dispatcher(message)
+        self.last_message = time.time()
+        self.deadlines.arm('timeout', self.timeout, self.on_timeout)
+
+        if self.tracer:
+            self.tracer.on_command(received, self.last_message)
 
-        # Get command
-        command = message
-        if len(payload) >= 1:
-            command = payload[0]
-            del payload[0]
+    def on_command(self, command: str, params: tuple):
+        """Handles a command that was decoded from a binary frame."""
+        received = time.time()
+        self.dispatcher.command(command, params)
+        self.last_message = time.time()
+        self.deadlines.arm('timeout', self.timeout, self.on_timeout)
 
-        # Get speed parameter
-        speed = 0
-        if len(payload) >= 1:
-            speed = int(payload[0])
+        if self.tracer:
+            self.tracer.on_command(received, self.last_message)
 
+    def forward(self, speed: int):
         # Prevent accelerating when blocked
         if not self.blocked:
-            if command == SOCKET_JOY_FORWARD:
-                self.controller.forward(speed)
-
-            if command == SOCKET_JOY_BACKWARD:
-                self.controller.reverse(speed)
-
-        if command == SOCKET_JOY_NEUTRAL:
-            self.controller.neutral()
-
-        if command == SOCKET_JOY_DIR_NEUTRAL:
-            self.controller.steer_neutral()
-
-        if command == SOCKET_JOY_DIR_LEFT:
-            self.controller.steer_left()
+            self.controller.forward(speed)
 
-        if command == SOCKET_JOY_DIR_RIGHT:
-            self.controller.steer_right()
-
-        if command == SOCKET_RECOGNITION_DETECTED:
-            print('Stopping for detected person')
-            self.block()
+    def reverse(self, speed: int):
+        # Prevent accelerating when blocked
+        if not self.blocked:
+            self.controller.reverse(speed)
 
-        if command == SOCKET_RECOGNITION_FREE:
-            print('Continue now that blockade is gone')
-            self.unblock()
+    def detected(self):
+        print('Stopping for detected person')
+        self.block()
 
-        self.last_message = time.time()
+    def free(self):
+        print('Continue now that blockade is gone')
+        self.unblock()
@@ -0,0 +1,151 @@
+import socket
+import struct
+from queue import Queue, Empty
+from threading import Thread, Lock
+from typing import Dict, FrozenSet, List
+
+from lib.constants import *
+
+# Every frame on the bus starts with the length of its payload and its kind
+FRAME = struct.Struct('!IB')
+
+BUS_ROUTE_ADD = 1
+BUS_ROUTE_REMOVE = 2
+BUS_BROADCAST = 3
+BUS_DATAGRAM = 4
+
+# Address of a forwarded datagram, the UDP socket of the server is IPv4
+ADDRESS = struct.Struct('!4sH')
+
+# Frames waiting for a worker beyond which broadcasts to it are dropped, route changes are always kept
+BUS_QUEUE_SIZE = 65536
+
+
+class WorkerBus:
+    """Connects the worker processes of a SocketServer, so that a broadcast reaches clients of other workers.
+
+    Every two workers share a socket pair. Workers announce the routes they gain and lose, and only
+    forward a broadcast to the workers that have clients for its route. Each peer is read by a thread
+    of its own and written by another thread from a queue. Handling a frame can write to the bus, e.g. a
+    forwarded datagram leads to a broadcast, but never blocks on it, so two workers that forward to each
+    other while their socket buffers are full cannot deadlock.
+    """
+
+    def __init__(self, server, peers: Dict[int, socket.socket]):
+        self.server = server
+        self.peers = peers
+        self.queues = {peer: Queue() for peer in peers}
+        self.dropped = 0
+
+        # Workers that have clients for a route, replaced instead of mutated like the routes of the server
+        self.remote: Dict[str, FrozenSet[int]] = {}
+        self.remote_lock = Lock()
+
+    @staticmethod
+    def mesh(workers: int) -> List[Dict[int, socket.socket]]:
+        """Creates a socket pair between every two workers, returns the sockets of every worker by peer."""
+        ends = [{} for i in range(workers)]
+
+        for i in range(workers):
+            for j in range(i + 1, workers):
+                ends[i][j], ends[j][i] = socket.socketpair()
+
+        return ends
+
+    def start(self):
+        for peer, connection in self.peers.items():
+            Thread(target=self.listen, args=(peer, connection), name='WorkerBus-' + str(peer), daemon=True).start()
+            Thread(target=self.send, args=(peer, connection), name='WorkerBusWriter-' + str(peer), daemon=True).start()
+
+    def listen(self, peer: int, connection: socket.socket):
+        buffer = bytearray()
+
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                print('Lost worker', peer)
+                return
+
+            buffer += data
+            position = 0
+
+            while len(buffer) - position >= FRAME.size:
+                size, kind = FRAME.unpack_from(buffer, position)
+                end = position + FRAME.size + size
+                if end > len(buffer):
+                    break
+
+                self.on_frame(peer, kind, bytes(buffer[position + FRAME.size:end]))
+                position = end
+
+            del buffer[:position]
+
+    def on_frame(self, peer: int, kind: int, payload: bytes):
+        if kind == BUS_BROADCAST:
+            route, separator, message = payload.decode().partition(' ')
+            attributes = message.split(' ')
+            self.server.broadcast(route, attributes[0], *attributes[1:], forwarded=True)
+        elif kind == BUS_DATAGRAM:
+            host, port = ADDRESS.unpack_from(payload)
+            self.server.on_datagram(payload[ADDRESS.size:], (socket.inet_ntoa(host), port), forwarded=True)
+        elif kind in (BUS_ROUTE_ADD, BUS_ROUTE_REMOVE):
+            route = payload.decode()
+
+            with self.remote_lock:
+                workers = self.remote.get(route, frozenset())
+                workers = workers | {peer} if kind == BUS_ROUTE_ADD else workers - {peer}
+
+                if workers:
+                    self.remote[route] = workers
+                else:
+                    self.remote.pop(route, None)
+
+    def send(self, peer: int, connection: socket.socket):
+        """Writes the queued frames of a peer, the frames that queued up meanwhile go out in a single write."""
+        queue = self.queues[peer]
+
+        while True:
+            frames = [queue.get()]
+
+            try:
+                while len(frames) < 256:
+                    frames.append(queue.get_nowait())
+            except Empty:
+                pass
+
+            try:
+                connection.sendall(b''.join(frames))
+            except OSError:
+                return
+
+    def write(self, peers, kind: int, payload: bytes):
+        """Queues a frame for the peers, in the order of the calls."""
+        frame = FRAME.pack(len(payload), kind) + payload
+
+        for peer in peers:
+            queue = self.queues[peer]
+
+            # Routes of a worker that stopped reading still arrive in order once it reads again
+            if kind in (BUS_BROADCAST, BUS_DATAGRAM) and queue.qsize() >= BUS_QUEUE_SIZE:
+                self.dropped += 1
+                continue
+
+            queue.put(frame)
+
+    def announce(self, kind: int, routes):
+        """Tells the other workers which routes this worker gained or lost."""
+        for route in routes:
+            self.write(self.peers, kind, route.encode())
+
+    def forward(self, route: str, command: str, params: tuple):
+        """Forwards a broadcast to the workers that have clients for the route."""
+        peers = self.peers if route == SOCKET_BROADCAST_ALL else self.remote.get(route)
+        if not peers:
+            return
+
+        message = ' '.join([route, command] + [str(param) for param in params])
+        self.write(peers, BUS_BROADCAST, message.encode())
+
+    def forward_datagram(self, data: bytes, address):
+        """Forwards a datagram that belongs to a client of another worker, the kernel picks the receiving worker."""
+        self.write(self.peers, BUS_DATAGRAM, ADDRESS.pack(socket.inet_aton(address[0]), address[1]) + data)
@@ -0,0 +1,32 @@
+from lib.CommandRegistry import Bounded, CommandRegistry
+from lib.constants import *
+
+SOCKET_IDENTITIES = [SOCKET_ID_RECOGNITION, SOCKET_ID_VEHICLE, SOCKET_ID_JOYSTICK, SOCKET_ID_FAKE]
+
+# Every command of the protocol, the relay routes commands with a target to all clients with that identity
+COMMANDS = CommandRegistry()
+
+COMMANDS.register(SOCKET_ERR_UNKNOWN_CMD)
+COMMANDS.register(SOCKET_DISCONNECT, senders=SOCKET_IDENTITIES)
+COMMANDS.register(SOCKET_PING, senders=SOCKET_IDENTITIES)
+COMMANDS.register(SOCKET_PONG, senders=SOCKET_IDENTITIES)
+
+# Clock of the sender, answered by the server with the same time and the clock of the server
+COMMANDS.register(SOCKET_CLOCK, params=(float, float), defaults=(0.0, 0.0), binary='dd', senders=SOCKET_IDENTITIES)
+
+# Power of the motors in percent, values out of range are rejected like parameters that are not a number
+COMMANDS.register(SOCKET_JOY_FORWARD, params=(Bounded(int, 0, 100),), defaults=(0,), binary='B',
+                  senders=[SOCKET_ID_JOYSTICK], target=SOCKET_ID_VEHICLE)
+COMMANDS.register(SOCKET_JOY_BACKWARD, params=(Bounded(int, 0, 100),), defaults=(0,), binary='B',
+                  senders=[SOCKET_ID_JOYSTICK], target=SOCKET_ID_VEHICLE)
+COMMANDS.register(SOCKET_JOY_NEUTRAL, senders=[SOCKET_ID_JOYSTICK], target=SOCKET_ID_VEHICLE)
+COMMANDS.register(SOCKET_JOY_DIR_LEFT, senders=[SOCKET_ID_JOYSTICK], target=SOCKET_ID_VEHICLE)
+COMMANDS.register(SOCKET_JOY_DIR_RIGHT, senders=[SOCKET_ID_JOYSTICK], target=SOCKET_ID_VEHICLE)
+COMMANDS.register(SOCKET_JOY_DIR_NEUTRAL, senders=[SOCKET_ID_JOYSTICK], target=SOCKET_ID_VEHICLE)
+
+# Trace number, input and send time of the preceding command and the time the server relayed it
+COMMANDS.register(SOCKET_TRACE, params=(int, float, float, float), defaults=(0, 0.0, 0.0, 0.0), binary='Iddd',
+                  senders=[SOCKET_ID_JOYSTICK], target=SOCKET_ID_VEHICLE)
+
+COMMANDS.register(SOCKET_RECOGNITION_DETECTED, senders=[SOCKET_ID_RECOGNITION], target=SOCKET_ID_VEHICLE)
+COMMANDS.register(SOCKET_RECOGNITION_FREE, senders=[SOCKET_ID_RECOGNITION], target=SOCKET_ID_VEHICLE)
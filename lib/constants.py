@@ -5,9 +5,22 @@ SOCKET_ID_FAKE = 'id_fake'
 
 SOCKET_ID_APPROVED = 'id_approved'
 
+# Hosts for which a client connects through the Unix domain socket of the server when it is available
+SOCKET_LOCAL_HOSTS = ('0.0.0.0', '127.0.0.1', 'localhost', '::1', '')
+
+# Separates the identity from the instance number, e.g. id_vehicle@2 is paired with id_joystick@2
+SOCKET_ID_SEPARATOR = '@'
+
+# Highest instance number, which keeps routes, metrics and recordings of clients bounded
+SOCKET_INSTANCE_MAX = 9999
+
 SOCKET_ERR_UNKNOWN_CMD = 'unknown_cmd'
 SOCKET_DISCONNECT = 'disconnect'
 SOCKET_BROADCAST_ALL = 'broadcast_all'
+SOCKET_CLOCK = 'clock'
+SOCKET_PING = 'ping'
+SOCKET_PONG = 'pong'
+SOCKET_TRACE = 'trace'
 SOCKET_EOL = '<|>'
 
 SOCKET_JOY_FORWARD = 'joy_forward'
@@ -19,3 +32,73 @@ SOCKET_JOY_DIR_NEUTRAL = 'joy_dir_neutral'
 
 SOCKET_RECOGNITION_DETECTED = 'recognition_detected'
 SOCKET_RECOGNITION_FREE = 'recognition_free'
+
+SOCKET_SERVER_THREADED = 'threaded'
+SOCKET_SERVER_SELECTOR = 'selector'
+
+SOCKET_QUEUE_DROP_OLDEST = 'drop_oldest'
+SOCKET_QUEUE_DROP_NEWEST = 'drop_newest'
+SOCKET_QUEUE_DISCONNECT = 'disconnect'
+
+# Control channels of which only the latest pending value is delivered when conflating
+SOCKET_CONFLATE_CHANNELS = {
+    SOCKET_JOY_FORWARD: 'speed',
+    SOCKET_JOY_BACKWARD: 'speed',
+    SOCKET_JOY_NEUTRAL: 'speed',
+    SOCKET_JOY_DIR_LEFT: 'steering',
+    SOCKET_JOY_DIR_RIGHT: 'steering',
+    SOCKET_JOY_DIR_NEUTRAL: 'steering',
+}
+
+SOCKET_PROTOCOL_BINARY = 'binary'
+SOCKET_PROTOCOL_DATAGRAM = 'datagram'
+SOCKET_PROTOCOL_HEARTBEAT = 'heartbeat'
+
+# Seconds between pings of the server per role, a peer is lost after missing SOCKET_HEARTBEAT_MISSES intervals
+SOCKET_HEARTBEAT_INTERVALS = {
+    SOCKET_ID_VEHICLE: 0.1,
+    SOCKET_ID_JOYSTICK: 0.5,
+    SOCKET_ID_RECOGNITION: 1.0,
+    SOCKET_ID_FAKE: 5.0,
+}
+SOCKET_HEARTBEAT_MISSES = 3
+
+# Seconds clients wait before reconnecting, doubled after every failed attempt up to the maximum and jittered.
+# Connecting and the identity handshake give up after the timeout.
+SOCKET_RECONNECT_MIN = 0.05
+SOCKET_RECONNECT_MAX = 2.0
+SOCKET_CONNECT_TIMEOUT = 2.0
+
+# Commands sent while disconnected are delivered after reconnecting, only the latest per control channel.
+# Heartbeats and measurements are meaningless once late and are not kept.
+SOCKET_OUTBOX_SIZE = 64
+SOCKET_OUTBOX_EXCLUDED = frozenset([SOCKET_PING, SOCKET_PONG, SOCKET_CLOCK, SOCKET_TRACE])
+
+# Commands that may travel over UDP, only the latest state matters for them. Identity, safety and every other
+# command stay on the TCP connection.
+SOCKET_DATAGRAM_COMMANDS = frozenset(SOCKET_CONFLATE_CHANNELS)
+
+# One byte opcodes of the binary protocol
+SOCKET_OPCODES = {
+    SOCKET_ERR_UNKNOWN_CMD: 0x01,
+    SOCKET_DISCONNECT: 0x02,
+    SOCKET_CLOCK: 0x03,
+    SOCKET_PING: 0x04,
+    SOCKET_PONG: 0x05,
+    SOCKET_JOY_FORWARD: 0x10,
+    SOCKET_JOY_BACKWARD: 0x11,
+    SOCKET_JOY_NEUTRAL: 0x12,
+    SOCKET_JOY_DIR_LEFT: 0x13,
+    SOCKET_JOY_DIR_RIGHT: 0x14,
+    SOCKET_JOY_DIR_NEUTRAL: 0x15,
+    SOCKET_RECOGNITION_DETECTED: 0x20,
+    SOCKET_RECOGNITION_FREE: 0x21,
+    SOCKET_TRACE: 0x30,
+}
+
+# GPIO backends of the actuators, rpi drives the pins and simulated records them without hardware
+GPIO_BACKEND_RPI = 'rpi'
+GPIO_BACKEND_SIMULATED = 'simulated'
+
+# Most recent pin changes kept in the timeline of the simulated backend, older changes are dropped
+GPIO_TIMELINE_SIZE = 10000
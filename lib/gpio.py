@@ -0,0 +1,33 @@
+"""GPIO backend of the controllers and actuators, selected with GPIO_BACKEND.
+
+The module that is imported as GPIO offers the RPi.GPIO interface, either RPi.GPIO itself or a SimulatedGPIO
+that records the pins in a timeline, so that the vehicles run on machines without GPIO pins.
+"""
+import os
+
+from lib.constants import *
+
+# noinspection PyUnresolvedReferences
+from lib import settings
+
+
+def load():
+    backend = os.getenv('GPIO_BACKEND') or GPIO_BACKEND_RPI
+
+    if backend == GPIO_BACKEND_SIMULATED:
+        from lib.SimulatedGPIO import SimulatedGPIO
+
+        return SimulatedGPIO(output_latency=float(os.getenv('GPIO_OUTPUT_LATENCY') or 0),
+                             pwm_latency=float(os.getenv('GPIO_PWM_LATENCY') or 0),
+                             timeline_size=int(os.getenv('GPIO_TIMELINE_SIZE') or GPIO_TIMELINE_SIZE))
+
+    if backend != GPIO_BACKEND_RPI:
+        raise ValueError('Unknown GPIO backend ' + backend)
+
+    # noinspection PyUnresolvedReferences
+    import RPi.GPIO
+
+    return RPi.GPIO
+
+
+GPIO = load()
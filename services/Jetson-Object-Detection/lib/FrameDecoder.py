@@ -0,0 +1 @@
+../../../lib/FrameDecoder.py
\ No newline at end of file
@@ -2,47 +2,94 @@ from threading import Thread
 
 from lib.config import load_config
 from lib.constants import *
+from lib.FrameDecoder import FrameDecoder
+import random
 import socket
 import time
 import select
 
 
 class SocketClient:
-    def __init__(self, identity: str, on_disconnect=None):
+    def __init__(self, identity: str, on_disconnect=None, heartbeat: bool = False):
         config = load_config()
         self.host = config['remote_host']
         self.port = config['remote_port']
         self.connection = None
         self.on_disconnect = on_disconnect
         self.identity = identity
+
+        # Instance number scopes detections to the vehicle with the same number
+        if config.get('remote_instance') is not None and SOCKET_ID_SEPARATOR not in identity:
+            self.identity = identity + SOCKET_ID_SEPARATOR + str(config['remote_instance'])
         self.connected = False
+        self.decoder = FrameDecoder()
+        self.pending = []
+
+        # The server pings this client every interval, so a lost connection is noticed within a few intervals. Only
+        # clients that run listen answer the pings, the server disconnects any other client that asks for them
+        self.heartbeat = heartbeat
+        self.heartbeat_timeout = 0.0
+        self.last_received = time.monotonic()
 
     def connect(self, times_retrying: int = 20) -> bool:
+        """Connects and identifies, retrying with a jittered exponential backoff. Returns False once all attempts
+        failed."""
+        delay = SOCKET_RECONNECT_MIN
+
+        while True:
+            try:
+                self.establish()
+                print('Connection established')
+                return True
+            except socket.error as exception:
+                print('Failed to connect to server:', exception)
+                self.connection.close()
+
+            if times_retrying <= 0:
+                return False
+
+            # Jitter keeps clients that lost the same server from reconnecting in lockstep
+            wait = random.uniform(delay / 2, delay)
+            times_retrying -= 1
+            print('Retrying in', round(wait, 3), 'seconds (' + str(times_retrying) + ' attempts left)')
+            time.sleep(wait)
+            delay = min(delay * 2, SOCKET_RECONNECT_MAX)
+
+    def establish(self) -> None:
         print('Connecting to remote host', self.host + ':' + str(self.port))
 
-        try:
-            self.connection = socket.socket()
-            self.connection.connect((self.host, self.port))
+        # Connecting and the identity handshake time out, a server that stops responding later is noticed through
+        # the heartbeats
+        self.connection = socket.socket()
+        self.connection.settimeout(SOCKET_CONNECT_TIMEOUT)
+        self.connection.connect((self.host, self.port))
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.decoder = FrameDecoder()
+        self.pending = []
+        if self.heartbeat:
+            self.send_command(self.identity, SOCKET_PROTOCOL_HEARTBEAT)
+        else:
             self.send_command(self.identity)
 
-            if not self.receive() == SOCKET_ID_APPROVED:
-                print('raised exception')
-                raise Exception('Unknown identity ' + self.identity)
+        messages = self.receive()
+        if messages is None:
+            raise ConnectionResetError('Server closed the connection during the identity handshake')
 
-            self.connected = True
-        except socket.error as exception:
-            print('Failed to connect to server:', exception)
+        attributes = messages.pop(0).split()
+        if attributes[:1] != [SOCKET_ID_APPROVED]:
+            print('raised exception')
+            raise Exception('Unknown identity ' + self.identity)
 
-            if times_retrying > 0:
-                print('Retrying in 2 seconds (' + str(times_retrying - 1) + ' attempts left)')
-                time.sleep(2)
-                return self.connect(times_retrying - 1)
+        self.connection.settimeout(None)
 
-            return False
+        self.heartbeat_timeout = 0.0
+        if SOCKET_PROTOCOL_HEARTBEAT in attributes:
+            interval = float(attributes[attributes.index(SOCKET_PROTOCOL_HEARTBEAT) + 1])
+            self.heartbeat_timeout = interval * SOCKET_HEARTBEAT_MISSES
 
-        print('Connection established')
+        # Messages sent right after the approval arrive in the same read
+        self.pending = messages
         self.connected = True
-        return True
 
     def disconnect(self) -> None:
         print('Closing connection')
@@ -59,29 +106,36 @@ class SocketClient:
         try:
             while True:
                 try:
-                    # Use select so that as soon as the connection fails, we will be able to reconnect
+                    while self.pending:
+                        self.deliver(callback, self.pending.pop(0))
+
+                    # Block until a message arrives, a closed connection is readable too so that we can reconnect
                     ready_to_read, ready_to_write, in_error = select.select(
-                        [self.connection, ], [self.connection, ], [], 5
+                        [self.connection, ], [], [], self.heartbeat_timeout or 5
                     )
 
                     if len(ready_to_read) > 0:
-                        recv = self.receive()
+                        messages = self.receive()
+                    elif self.heartbeat_timeout and time.monotonic() - self.last_received > self.heartbeat_timeout:
+                        print('Server stopped sending heartbeats')
+                        messages = None
+                    else:
+                        messages = []
 
-                        if not recv:
-                            print('Server left the room')
-                            self.disconnect()
+                    if messages is None:
+                        print('Server left the room')
+                        self.disconnect()
 
-                            if not reconnect:
-                                break
+                        if not reconnect:
+                            break
 
-                            if not self.connect():
-                                break
+                        if not self.connect():
+                            break
 
-                            continue
+                        continue
 
-                        messages = recv.strip(SOCKET_EOL).split(SOCKET_EOL)
-                        for message in messages:
-                            callback(message)
+                    for message in messages:
+                        self.deliver(callback, message)
 
                 except select.error as exception:
                     print('Connection error:', exception)
@@ -92,13 +146,29 @@ class SocketClient:
 
                     if not self.connect():
                         break
-
-                time.sleep(0.1)
         except KeyboardInterrupt:
             self.disconnect()
 
     def receive(self):
-        return self.connection.recv(1024).decode()
+        """Blocks until at least one complete message arrived, returns None when the server left."""
+        while True:
+            data = self.connection.recv(4096)
+
+            if not data:
+                return None
+
+            self.last_received = time.monotonic()
+            messages = self.decoder.feed(data)
+            if messages:
+                return messages
+
+    def deliver(self, callback, message: str) -> None:
+        """Answers heartbeats of the server, every other message goes to the callback."""
+        if message == SOCKET_PING:
+            self.send_command(SOCKET_PONG)
+            return
+
+        callback(message)
 
     def send(self, message: str) -> bool:
         try:
@@ -127,7 +197,7 @@ if __name__ == '__main__':
 
 
     print('Enter identity:')
-    client = SocketClient('id_' + input(), on_disconnect)
+    client = SocketClient('id_' + input(), on_disconnect, heartbeat=True)
 
     if client.connect():
         Thread(target=communicate, args=(client,), daemon=True).start()
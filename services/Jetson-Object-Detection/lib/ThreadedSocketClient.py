@@ -20,7 +20,7 @@ class ThreadedSocketClient(Thread):
 
     def run(self):
         # Create Socket connection
-        client = SocketClient(SOCKET_ID_RECOGNITION)
+        client = SocketClient(SOCKET_ID_RECOGNITION, heartbeat=True)
         client.connect(99999)
 
         # Add listen thread for automatic reconnecting
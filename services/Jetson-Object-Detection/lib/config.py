@@ -6,9 +6,9 @@ def load_config():
     """Load config params."""
     if os.path.isfile('config.yml'):
         with open("config.yml", 'r') as ymlfile:
-            config = yaml.load(ymlfile)
+            config = yaml.safe_load(ymlfile)
     else:
         with open("config.sample.yml", 'r') as ymlfile:
-            config = yaml.load(ymlfile)
+            config = yaml.safe_load(ymlfile)
 
     return config
@@ -5,9 +5,23 @@ SOCKET_ID_FAKE = 'id_fake'
 
 SOCKET_ID_APPROVED = 'id_approved'
 
+# Asks the server to ping this client, the approval then holds the interval of the pings
+SOCKET_PROTOCOL_HEARTBEAT = 'heartbeat'
+SOCKET_HEARTBEAT_MISSES = 3
+
+# Seconds the client waits before reconnecting, doubled after every failed attempt up to the maximum and jittered
+SOCKET_RECONNECT_MIN = 0.05
+SOCKET_RECONNECT_MAX = 2.0
+SOCKET_CONNECT_TIMEOUT = 2.0
+
+# Separates the identity from the instance number, e.g. id_vehicle@2 is paired with id_joystick@2
+SOCKET_ID_SEPARATOR = '@'
+
 SOCKET_ERR_UNKNOWN_CMD = 'unknown_cmd'
 SOCKET_DISCONNECT = 'disconnect'
 SOCKET_BROADCAST_ALL = 'broadcast_all'
+SOCKET_PING = 'ping'
+SOCKET_PONG = 'pong'
 SOCKET_EOL = '<|>'
 
 SOCKET_JOY_FORWARD = 'joy_forward'